@@ -0,0 +1,251 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import platform
+import numpy as np
+import torch
+from whisper.model import Whisper, ModelDimensions
+from whisper.tokenizer import get_tokenizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'whisper'))
+sys.path.append(os.path.join(ROOT, 'google'))
+from audio_cache import AudioCache
+from batched import transcribe_files, PRESETS, DEFAULT_PRESET
+from backends import BACKENDS
+from async_client import StubRecognizer, transcribe_all
+from common.pipeline import stage, run_pipeline
+from common.metrics import score_pair
+from common.normalization import clean_transcript, normalize, normalize_batch
+from common.diacritics import LETTERS, confusion_counts, totals_and_errors
+from common.instrumentation import wav_seconds
+from common import plots
+from metrics_kernel import perturb
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+WHISPER_FIXTURES = [('whisper/test/testwavM', 'whisper/test/testtxtM'), ('whisper/test/testwavF', 'whisper/test/testtxtF')]
+GOOGLE_AUDIO_DIR = 'google/veprad_audio'
+GOOGLE_TRANSCRIPT_DIR = 'google/veprad_transcripts'
+
+# a few MB instead of the real checkpoints, same code paths as the real models
+TINY_DIMS = dict(
+    n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=2,
+    n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=2,
+)
+
+def tiny_model(seed=0):
+    torch.manual_seed(seed)
+    model = Whisper(ModelDimensions(**TINY_DIMS))
+    with torch.no_grad():
+        for p in model.parameters():
+            p.normal_(std=0.02)
+        # the decoder always ends the text at once: random weights would ramble for
+        # the whole context and go through every fallback temperature
+        direction = torch.randn(model.dims.n_text_state)
+        model.decoder.ln.weight.zero_()
+        model.decoder.ln.bias.copy_(direction)
+        model.decoder.token_embedding.weight[get_tokenizer(True).eot] = direction * 0.5
+    return model.eval()
+
+def load_fixtures(n_files, seed=0):
+    # bundled VEPRAD clips with their references, the same sample on every run
+    items = []
+    for wav_dir, txt_dir in WHISPER_FIXTURES:
+        for wav_path in sorted(glob.glob(os.path.join(ROOT, wav_dir, '*.wav'))):
+            fid = os.path.splitext(os.path.basename(wav_path))[0]
+            txt_path = os.path.join(ROOT, txt_dir, fid + '.txt')
+            if os.path.exists(txt_path):
+                items.append((fid, wav_path, txt_path))
+    random.Random(seed).shuffle(items)
+    return sorted(items[:n_files])
+
+def read_reference(txt_path):
+    with open(txt_path, encoding='utf-8') as f:
+        return clean_transcript(f.read()).strip()
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+def percentiles(latencies):
+    if not latencies:
+        return {'p50': None, 'p95': None}
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {'p50': float(p50), 'p95': float(p95)}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def bench_whisper(model, items, audio_seconds, batch_size, cache_dir, preset=DEFAULT_PRESET):
+    # end to end through the same decode → transcribe → score pipeline as whisper/main.py
+    audio_cache = AudioCache(cache_dir)
+    started, latencies, fallbacks = {}, [], []
+
+    def decode(entry):
+        started[entry[0]] = time.perf_counter()
+        return entry, audio_cache.get(entry[1])
+
+    def transcribe(batch):
+        hyps = transcribe_files(model, [audio for _, audio in batch], batch_size, 'hr', preset, fallbacks)
+        return [(entry, hyp) for (entry, _), hyp in zip(batch, hyps)]
+
+    def score_item(entry):
+        (fid, wav_path, txt_path), hyp = entry
+        result = score_pair(read_reference(txt_path), hyp, normalize)
+        latencies.append(time.perf_counter() - started[fid])
+        return result
+
+    stages = [
+        stage('decode', decode, 2),
+        stage('transcribe', transcribe, 1, max(batch_size, 1)),
+        stage('score', score_item, 2),
+    ]
+    normalize.cache_clear()
+    _, wall = timed(lambda: list(run_pipeline(items, stages)))
+    return {
+        'files': len(items),
+        'wall_s': wall,
+        'files_per_s': len(items) / wall,
+        'rtf': wall / audio_seconds,
+        'latency_s': percentiles(latencies),
+        'fallbacks': sum(fallbacks),
+    }
+
+def bench_stages(model, items, batch_size, cache_dir, plot_dir, preset=DEFAULT_PRESET):
+    # every stage on its own, one after another, on the same files; the text stages
+    # score the references against perturbed copies, the stand-in model outputs nothing
+    timings = {}
+    audio_cache = AudioCache(cache_dir)
+    audios, timings['decode'] = timed(lambda: [audio_cache.get(wav_path) for _, wav_path, _ in items])
+    _, timings['inference'] = timed(transcribe_files, model, audios, batch_size, 'hr', preset)
+    rng = random.Random(0)
+    refs = [read_reference(txt_path) for _, _, txt_path in items]
+    hyps = [perturb(normalize(ref), rng) for ref in refs]
+
+    normalize.cache_clear()
+    _, timings['normalization'] = timed(normalize_batch, refs + hyps)
+    scores, timings['metrics'] = timed(lambda: [score_pair(r, h, normalize) for r, h in zip(refs, hyps)])
+    conf, timings['diacritics'] = timed(confusion_counts, refs, hyps)
+
+    total, errors = totals_and_errors(conf)
+    rates = np.divide(errors[0], total[0], out=np.zeros(len(LETTERS)), where=total[0] > 0)
+    figures = [
+        plots.figure(os.path.join(plot_dir, "der_per_letter.png"), plots.bar,
+                     {'x': LETTERS, 'y': rates.tolist()}, title="DER po slovu", ylabel="Error rate"),
+        plots.figure(os.path.join(plot_dir, "wer_boxplot.png"), plots.grouped_boxplot,
+                     {'tiny': [s['wer'] for s in scores]}, title="WER", xlabel="Model", ylabel="WER"),
+    ]
+    _, timings['plotting'] = timed(plots.render_all, figures, 1)
+    return timings
+
+def bench_google(n_files, latency, max_in_flight, rate, result_dir):
+    # async client path against the offline stub recognizer
+    audio_files = sorted(glob.glob(os.path.join(ROOT, GOOGLE_AUDIO_DIR, '*.wav')))[:n_files]
+    jobs = [(path, os.path.join(result_dir, os.path.basename(path)[:-4] + '.txt')) for path in audio_files]
+    recognizer = StubRecognizer(os.path.join(ROOT, GOOGLE_TRANSCRIPT_DIR), latency)
+    latencies = []
+
+    async def timed_recognize(audio_path, content, recognize=recognizer.recognize):
+        start = time.perf_counter()
+        try:
+            return await recognize(audio_path, content)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    recognizer.recognize = timed_recognize
+
+    _, wall = timed(lambda: asyncio.run(transcribe_all(jobs, recognizer, max_in_flight, rate)))
+    audio_seconds = sum(wav_seconds(path) for path in audio_files)
+    return {
+        'files': len(jobs),
+        'wall_s': wall,
+        'files_per_s': len(jobs) / wall if wall else None,
+        'rtf': wall / audio_seconds if audio_seconds else None,
+        'latency_s': percentiles(latencies),
+    }
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nUsporedba s {baseline_path} (omjer sada / prije, > 1 je sporije):")
+    rows = [('whisper wall_s', ('whisper', 'wall_s')), ('google wall_s', ('google', 'wall_s'))]
+    rows += [(f"faza {name}", ('stages_s', name)) for name in report['stages_s']]
+    for label, (section, key) in rows:
+        old = baseline.get(section, {}).get(key)
+        new = report[section][key]
+        if old:
+            print(f"  {label:<22} {new / old:.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mjerenje brzine evaluacije i analize na priloženim isječcima")
+    parser.add_argument('--files', type=int, default=16, help="broj isječaka za mjerenje")
+    parser.add_argument('--batch-size', type=int, default=8, help="broj isječaka po batchu")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='torch', help="backend za inferenciju (vidi whisper/backends.py)")
+    parser.add_argument('--preset', choices=list(PRESETS), default=DEFAULT_PRESET, help="postavke dekodiranja (vidi whisper/batched.py)")
+    parser.add_argument('--stub-latency', type=float, default=0.05, help="simulirano kašnjenje lažnog Google prepoznavača (s)")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="najveći broj istovremenih zahtjeva")
+    parser.add_argument('--rate', type=float, default=100.0, help="najveći broj zahtjeva po sekundi")
+    parser.add_argument('--output', default='benchmark.json', help="JSON datoteka s rezultatima")
+    parser.add_argument('--baseline', default=None, help="JSON prethodnog mjerenja za usporedbu")
+    args = parser.parse_args()
+
+    items = load_fixtures(args.files)
+    audio_seconds = sum(wav_seconds(wav_path) for _, wav_path, _ in items)
+    print(f"Isječaka: {len(items)} ({audio_seconds:.1f} s zvuka)")
+    model = BACKENDS[args.backend](tiny_model())
+
+    work_dir = tempfile.mkdtemp(prefix='asr_bench_')
+    try:
+        # fresh cache directories so decoding is measured cold
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'torch_threads': torch.get_num_threads(),
+            'files': len(items),
+            'audio_s': audio_seconds,
+            'batch_size': args.batch_size,
+            'inference_backend': args.backend,
+            'decoding_preset': args.preset,
+            'whisper': bench_whisper(model, items, audio_seconds, args.batch_size, os.path.join(work_dir, 'pipeline'), args.preset),
+            'stages_s': bench_stages(model, items, args.batch_size, os.path.join(work_dir, 'stages'), os.path.join(work_dir, 'plots'), args.preset),
+            'google': bench_google(args.files, args.stub_latency, args.max_in_flight, args.rate, work_dir),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    for backend in ['whisper', 'google']:
+        r = report[backend]
+        print(f"{backend}: {r['files_per_s']:.2f} datoteka/s, RTF {r['rtf']:.3f}, "
+              f"p50 {r['latency_s']['p50']:.3f} s, p95 {r['latency_s']['p95']:.3f} s")
+    print(f"whisper: {report['whisper']['fallbacks']} ponovnih dekodiranja (preset {args.preset})")
+    for name, seconds in report['stages_s'].items():
+        print(f"  {name:<14} {seconds:.3f} s")
+    if report['peak_rss_mb'] is not None:
+        print(f"Najveća zauzeta memorija (RSS): {report['peak_rss_mb']:.0f} MB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Rezultati su zapisani u '{args.output}'")
+    if args.baseline:
+        compare(report, args.baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+import jiwer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import score_pair
+from common.normalization import clean_transcript, normalize
+
+TRANSCRIPT_DIRS = ['google/veprad_transcripts', 'whisper/test/testtxtM', 'whisper/test/testtxtF']
+STRIP_DIACRITICS = str.maketrans('čćšžđ', 'ccszd')
+
+def load_pairs(seed=0):
+    # bundled references with deterministic synthetic hypotheses: some words lose
+    # their diacritics, some are dropped and some are inserted
+    rng = random.Random(seed)
+    pairs = []
+    for d in TRANSCRIPT_DIRS:
+        for path in sorted(glob.glob(os.path.join(d, '*.txt'))):
+            with open(path, encoding='utf-8') as f:
+                ref = normalize(clean_transcript(f.read()))
+            if not ref:
+                continue
+            pairs.append((ref, perturb(ref, rng)))
+    return pairs
+
+def perturb(ref, rng):
+    hyp = []
+    for word in ref.split():
+        roll = rng.random()
+        if roll < 0.05:
+            continue
+        if roll < 0.15:
+            word = word.translate(STRIP_DIACRITICS)
+        hyp.append(word)
+        if rng.random() < 0.03:
+            hyp.append('umetak')
+    return ' '.join(hyp)
+
+DIAC_CHARS = ['č', 'ć', 'š', 'ž', 'đ', 'Č', 'Ć', 'Š', 'Ž', 'Đ']
+
+def legacy_whisper(ref, hyp):
+    # what whisper/main.py did before: jiwer.wer and jiwer.cer, then DER index by index
+    jiwer.wer(ref, hyp)
+    jiwer.cer(ref, hyp)
+    total = sum(ref.count(c) for c in DIAC_CHARS)
+    wrong = sum(1 for i, r in enumerate(ref) if r in DIAC_CHARS and (i >= len(hyp) or hyp[i].lower() != r.lower()))
+    return wrong / total if total else None
+
+def legacy_google(ref, hyp):
+    # what google/main.py did before: one word and one character report, no DER
+    jiwer.process_words(ref, hyp)
+    jiwer.process_characters(ref, hyp)
+
+def kernel(ref, hyp):
+    return score_pair(ref, hyp)
+
+def timed(fn, pairs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for ref, hyp in pairs:
+            fn(ref, hyp)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Usporedba brzine starog izračuna metrika i zajedničkog kernela")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pairs = load_pairs()
+    print(f"Parova referenca/hipoteza: {len(pairs)}")
+    t_kernel = timed(kernel, pairs, args.repeat)
+    print(f"score_pair (jedno poravnanje riječi i znakova, uz DER i poravnanje): {t_kernel:.3f} s ({len(pairs) / t_kernel:.0f} parova/s)")
+    for label, fn in [("whisper: jiwer.wer + jiwer.cer + DER po indeksu", legacy_whisper),
+                      ("google: process_words + process_characters", legacy_google)]:
+        t_legacy = timed(fn, pairs, args.repeat)
+        print(f"{label}: {t_legacy:.3f} s ({len(pairs) / t_legacy:.0f} parova/s), ubrzanje {t_legacy / t_kernel:.2f}x")
+
+if __name__ == '__main__':
+    main()
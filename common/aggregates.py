@@ -0,0 +1,164 @@
+import os
+import pickle
+from collections import Counter
+import numpy as np
+import pandas as pd
+from common.diacritics import LETTERS, HYP_LABELS, diacritic_events
+from common.metrics import score_pair
+
+METRICS = ['wer', 'cer', 'der']
+STATE_NAME = ".analysis_aggregates.pkl"
+STATE_VERSION = 1
+
+def error_words(ref, alignment):
+    # reference words inside substituted and deleted chunks of a word alignment
+    ref_words = str(ref).split()
+    words = []
+    for chunk_type, ref_start, ref_end, _, _ in alignment:
+        if chunk_type in ('substitute', 'delete'):
+            words.extend(ref_words[ref_start:ref_end])
+    return words
+
+def _empty(n_metrics):
+    return {
+        'rows': 0,
+        'n': np.zeros(n_metrics),      # rows with a value (DER is NaN without diacritics)
+        'sum': np.zeros(n_metrics),
+        'sumsq': np.zeros(n_metrics),
+        'confusion': np.zeros((len(LETTERS), len(HYP_LABELS)), dtype=np.int64),
+        'words': Counter(),
+    }
+
+def _add(part, other):
+    for field in ('rows', 'n', 'sum', 'sumsq', 'confusion'):
+        part[field] = part[field] + other[field]
+    part['words'].update(other['words'])
+
+class Aggregates:
+    # mergeable per-partition sums (counts, sums, sums of squares, diacritic confusion
+    # counts, word-error counters) kept on disk between analysis runs; every row's own
+    # contribution is kept too, so update() only aligns rows that were added or changed
+    # and subtracts the old contribution of changed and removed rows
+    def __init__(self, path, partition_columns=('model', 'gender'), key_columns=('model', 'file_id'),
+                 metrics=METRICS, word_errors=False):
+        self.path = path
+        self.partition_columns = list(partition_columns)
+        self.key_columns = list(key_columns)
+        self.metrics = list(metrics)
+        self.word_errors = word_errors
+        self.signature = (STATE_VERSION, tuple(self.partition_columns), tuple(self.key_columns),
+                          tuple(self.metrics), word_errors, tuple(LETTERS), tuple(HYP_LABELS))
+        # rows: key → (digest, partition, metric values, confusion cells, error words)
+        self.rows, self.partitions = {}, {}
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            if state.get('signature') == self.signature:
+                self.rows, self.partitions = state['rows'], state['partitions']
+
+    def _apply(self, contribution, sign):
+        _, key, values, cells, words = contribution
+        part = self.partitions.setdefault(key, _empty(len(self.metrics)))
+        values = np.array(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        values[~present] = 0.0
+        part['rows'] += sign
+        part['n'] += sign * present
+        part['sum'] += sign * values
+        part['sumsq'] += sign * values ** 2
+        np.add.at(part['confusion'].reshape(-1), list(cells), sign)
+        if sign > 0:
+            part['words'].update(words)
+        else:
+            part['words'].subtract(words)
+            part['words'] = +part['words']
+        if part['rows'] == 0:
+            del self.partitions[key]
+
+    def update(self, df, alignments=None):
+        # folds df (all current rows) into the aggregates and returns the partitions
+        # whose aggregates changed; alignments, when given, is called once if any row has
+        # to be aligned and returns {key: word alignment chunks} that were already stored
+        df = df[~df.duplicated(self.key_columns, keep='last')].reset_index(drop=True)
+        columns = self.key_columns + [c for c in self.partition_columns if c not in self.key_columns]
+        digests = pd.util.hash_pandas_object(df[columns + self.metrics + ['ref', 'hyp']], index=False).tolist()
+        keys = list(zip(*(df[c].astype(str) for c in self.key_columns)))
+        current = set(keys)
+
+        affected = set()
+        removed = [key for key in self.rows if key not in current]
+        for key in removed:
+            affected.add(self.rows[key][1])
+            self._apply(self.rows.pop(key), -1)
+        changed = [i for i, (key, digest) in enumerate(zip(keys, digests))
+                   if key not in self.rows or self.rows[key][0] != digest]
+        for i in changed:
+            if keys[i] in self.rows:
+                affected.add(self.rows[keys[i]][1])
+                self._apply(self.rows.pop(keys[i]), -1)
+
+        if changed:
+            rows = df.iloc[changed]
+            refs, hyps = rows['ref'].astype(str).tolist(), rows['hyp'].astype(str).tolist()
+            # one alignment pass over the changed rows only, split back per row
+            event_rows, letters, labels = diacritic_events(refs, hyps)
+            cells = letters * len(HYP_LABELS) + labels
+            bounds = np.searchsorted(event_rows, np.arange(len(changed) + 1))
+            values = rows[self.metrics].to_numpy(dtype=np.float64)
+            parts = list(zip(*(rows[c].astype(str) for c in self.partition_columns)))
+            stored = alignments() if (self.word_errors and alignments is not None) else {}
+            for j, i in enumerate(changed):
+                words = ()
+                if self.word_errors:
+                    alignment = stored.get(keys[i])
+                    if alignment is None:
+                        alignment = score_pair(refs[j], hyps[j])['alignment']
+                    words = tuple(error_words(refs[j], alignment))
+                contribution = (digests[i], parts[j], tuple(values[j].tolist()),
+                                tuple(cells[bounds[j]:bounds[j + 1]].tolist()), words)
+                self.rows[keys[i]] = contribution
+                self._apply(contribution, 1)
+                affected.add(parts[j])
+
+        print(f"Agregati: {len(changed)} novih ili promijenjenih, {len(removed)} uklonjenih, "
+              f"{len(self.rows)} redaka ukupno; promijenjeno particija: {len(affected)}")
+        return affected
+
+    def merged(self, by=()):
+        # partitions summed over every partition column not in by → {group: aggregates}
+        idx = [self.partition_columns.index(c) for c in by]
+        groups = {}
+        for key in sorted(self.partitions):
+            group = tuple(key[i] for i in idx)
+            _add(groups.setdefault(group, _empty(len(self.metrics))), self.partitions[key])
+        return groups
+
+    def moments(self, by=()):
+        # n, mean and std (ddof=1, as pandas) of every metric per group, from the sums alone
+        index, rows = [], []
+        for group, part in self.merged(by).items():
+            n, total = part['n'], part['sum']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / n
+                std = np.sqrt(np.maximum(part['sumsq'] - total * mean, 0.0) / (n - 1))
+            std[n < 2] = np.nan
+            index.append(group)
+            rows.append([v for i in range(len(self.metrics)) for v in (int(n[i]), mean[i], std[i])])
+        columns = pd.MultiIndex.from_product([self.metrics, ['n', 'mean', 'std']])
+        index = pd.MultiIndex.from_tuples(index, names=list(by)) if by else pd.Index(['sve'] * len(index))
+        return pd.DataFrame(rows, index=index, columns=columns)
+
+    def confusion(self, by=()):
+        # {group: letters × hyp labels counts}
+        return {group: part['confusion'] for group, part in self.merged(by).items()}
+
+    def error_counter(self, by=()):
+        # {group: Counter of reference words that were substituted or deleted}
+        return {group: part['words'] for group, part in self.merged(by).items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        state = {'signature': self.signature, 'rows': self.rows, 'partitions': self.partitions}
+        with open(self.path + ".tmp", 'wb') as f:
+            pickle.dump(state, f, protocol=4)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,80 @@
+import numpy as np
+
+try:
+    # comes with jiwer, C implementation of the edit-distance backtrace
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+def _ids(seq, vocab):
+    return np.array([vocab.setdefault(tok, len(vocab)) for tok in seq], dtype=np.int64)
+
+def _opcodes_numpy(ref, hyp):
+    vocab = {}
+    r, h = _ids(ref, vocab), _ids(hyp, vocab)
+    n, m = len(r), len(h)
+    cols = np.arange(m + 1)
+    dist = np.empty((n + 1, m + 1), dtype=np.int64)
+    dist[0] = cols
+    for i in range(1, n + 1):
+        # substitution/deletion for the whole row at once, insertions via a running minimum
+        row = np.empty(m + 1, dtype=np.int64)
+        row[0] = i
+        row[1:] = np.minimum(dist[i - 1, 1:] + 1, dist[i - 1, :-1] + (h != r[i - 1]))
+        dist[i] = np.minimum.accumulate(row - cols) + cols
+
+    steps = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and dist[i, j] == dist[i - 1, j - 1] + (r[i - 1] != h[j - 1]):
+            steps.append('equal' if r[i - 1] == h[j - 1] else 'replace')
+            i, j = i - 1, j - 1
+        elif i > 0 and dist[i, j] == dist[i - 1, j] + 1:
+            steps.append('delete')
+            i -= 1
+        else:
+            steps.append('insert')
+            j -= 1
+
+    ops = []
+    i = j = 0
+    for tag in reversed(steps):
+        di, dj = (0, 1) if tag == 'insert' else (1, 0) if tag == 'delete' else (1, 1)
+        if ops and ops[-1][0] == tag:
+            ops[-1][2] += di
+            ops[-1][4] += dj
+        else:
+            ops.append([tag, i, i + di, j, j + dj])
+        i, j = i + di, j + dj
+    return [tuple(op) for op in ops]
+
+def opcodes(ref, hyp):
+    # (tag, ref_start, ref_end, hyp_start, hyp_end) blocks, tag in equal/replace/delete/insert;
+    # works on strings (characters) and on lists of words alike
+    if Levenshtein is None:
+        return _opcodes_numpy(ref, hyp)
+    return [tuple(op) for op in Levenshtein.opcodes(ref, hyp)]
+
+def ref_to_hyp(ops, n_ref):
+    # index of the aligned hypothesis token for every reference token, -1 if deleted
+    mapping = np.full(n_ref, -1, dtype=np.int64)
+    for tag, i1, i2, j1, j2 in ops:
+        if tag in ('equal', 'replace'):
+            k = min(i2 - i1, j2 - j1)
+            mapping[i1:i1 + k] = np.arange(j1, j1 + k)
+    return mapping
+
+def counts(ops):
+    hits = subs = dels = ins = 0
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            hits += i2 - i1
+        elif tag == 'replace':
+            subs += min(i2 - i1, j2 - j1)
+            dels += max(0, (i2 - i1) - (j2 - j1))
+            ins += max(0, (j2 - j1) - (i2 - i1))
+        elif tag == 'delete':
+            dels += i2 - i1
+        else:
+            ins += j2 - j1
+    return hits, subs, dels, ins
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+from difflib import SequenceMatcher
+import numpy as np
+from common import vad
+from common.normalization import normalize
+
+# a cut is searched for in the last SEARCH_SECONDS before the chunk limit, every
+# chunk after the first starts OVERLAP_SECONDS before the previous cut
+SEARCH_SECONDS = 5.0
+OVERLAP_SECONDS = 1.5
+# stitching compares this many words at the end of one chunk and the start of the next
+STITCH_WINDOW = 20
+
+def chunk_bounds(audio, sample_rate, max_seconds, overlap_seconds=OVERLAP_SECONDS, search_seconds=SEARCH_SECONDS):
+    # [(start, end)] chunks of at most max_seconds, cut at the quietest frame near the limit
+    max_len = int(max_seconds * sample_rate)
+    if len(audio) <= max_len:
+        return [(0, len(audio))]
+    overlap = int(overlap_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), max_len - overlap - 1)
+    db, frame_len = vad.frame_db(audio, sample_rate)
+
+    bounds, start = [], 0
+    while len(audio) - start > max_len:
+        first = (start + max_len - search) // frame_len + 1
+        last = max((start + max_len) // frame_len, first + 1)
+        quietest = first + int(np.argmin(db[first:last]))
+        cut = min(quietest * frame_len + frame_len // 2, start + max_len)
+        bounds.append((start, cut))
+        start = cut - overlap
+    bounds.append((start, len(audio)))
+    return bounds
+
+def _stitch_pair(words, next_words, window, min_match):
+    tail, head = words[-window:], next_words[:window]
+    match = SequenceMatcher(
+        None, [normalize(w) for w in tail], [normalize(w) for w in head], autojunk=False
+    ).find_longest_match(0, len(tail), 0, len(head))
+    if match.size == 0 or match.size < min(min_match, len(head)):
+        return words + next_words
+    # words before the shared run come from the earlier chunk, the rest from the later one
+    return words[:len(words) - len(tail) + match.a + match.size] + next_words[match.b + match.size:]
+
+def stitch(texts, window=STITCH_WINDOW, min_match=2):
+    # joins chunk hypotheses; words heard in the overlap of two chunks are kept once
+    words = []
+    for text in texts:
+        next_words = text.split()
+        words = _stitch_pair(words, next_words, window, min_match) if words else next_words
+    return " ".join(words)
+
+class WavChunkCache:
+    # chunked (and with trim, silence-trimmed) copies of .wav files for backends that send
+    # the file itself; <name>.<key>.json lists the pieces and is written last
+    def __init__(self, cache_dir, max_seconds=None, overlap_seconds=OVERLAP_SECONDS, trim=False):
+        self.cache_dir = cache_dir
+        self.max_seconds = max_seconds
+        self.overlap_seconds = overlap_seconds
+        self.trim = trim
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, wav_path):
+        st = os.stat(wav_path)
+        ident = (f"{os.path.abspath(wav_path)}:{st.st_size}:{st.st_mtime_ns}:"
+                 f"{vad.TAG if self.trim else ''}:{self.max_seconds}:{self.overlap_seconds}")
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()[:12]
+
+    def get(self, wav_path):
+        # {'segments': [paths], 'original_s': .., 'trimmed_s': ..}
+        stem = os.path.splitext(os.path.basename(wav_path))[0]
+        prefix = os.path.join(self.cache_dir, f"{stem}.{self._key(wav_path)}")
+        index_path = prefix + ".json"
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                return json.load(f)
+
+        audio, sample_rate = vad.read_wav(wav_path)
+        kept = vad.trim(audio, sample_rate) if self.trim else audio
+        pieces = [(0, len(kept))]
+        if self.max_seconds:
+            pieces = chunk_bounds(kept, sample_rate, self.max_seconds, self.overlap_seconds)
+        segments = []
+        for i, (start, end) in enumerate(pieces):
+            segments.append(f"{prefix}.{i}.wav")
+            vad.write_wav(segments[-1], kept[start:end], sample_rate)
+
+        index = {'segments': segments, 'original_s': len(audio) / sample_rate, 'trimmed_s': len(kept) / sample_rate}
+        with open(index_path + f".{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(index_path + f".{os.getpid()}.tmp", index_path)
+        return index
@@ -0,0 +1,69 @@
+import os
+import glob
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from common.normalization import clean_transcript
+
+MANIFEST_NAME = ".cleanup_manifest.json"
+# bump when clean_transcript rules change so every file is cleaned again
+CLEANUP_VERSION = 1
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return manifest.get("files", {}) if manifest.get("version") == CLEANUP_VERSION else {}
+
+def save_manifest(out_dir, files):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CLEANUP_VERSION, "files": files}, f, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def clean_file(path, out_dir, known_hash):
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    name = os.path.basename(path)
+    out_path = os.path.join(out_dir, name)
+    if digest == known_hash and os.path.exists(out_path):
+        return name, digest, False
+
+    text = clean_transcript(raw.decode("utf-8"))
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return name, digest, True
+
+def clean_directory(input_dir, pool, force=False):
+    out_dir = os.path.join(input_dir, "cleaned")
+    os.makedirs(out_dir, exist_ok=True)
+    known = {} if force else load_manifest(out_dir)
+
+    paths = sorted(glob.glob(os.path.join(input_dir, "*.txt")))
+    futures = [pool.submit(clean_file, p, out_dir, known.get(os.path.basename(p))) for p in paths]
+    files, written = {}, 0
+    for future in futures:
+        name, digest, changed = future.result()
+        files[name] = digest
+        written += changed
+    save_manifest(out_dir, files)
+    return written, len(paths)
+
+def main(default_dirs, argv=None):
+    parser = argparse.ArgumentParser(description="Čišćenje VEPRAD transkripata (rezultat u <direktorij>/cleaned/)")
+    parser.add_argument("dirs", nargs="*", default=default_dirs, help="direktoriji s .txt datotekama")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4), help="broj dretvi")
+    parser.add_argument("--force", action="store_true", help="očisti i nepromijenjene datoteke")
+    args = parser.parse_args(argv)
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        for input_dir in args.dirs:
+            written, total = clean_directory(input_dir, pool, args.force)
+            print(f"{input_dir}: očišćeno {written}, preskočeno {total - written} nepromijenjenih")
+
+    print("Gotovo čišćenje!")
@@ -0,0 +1,101 @@
+import os
+import json
+import wave
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from common.result_store import file_hash
+
+# bump when the probed fields change so every file is probed again
+MANIFEST_VERSION = 1
+SCAN_THREADS = min(32, (os.cpu_count() or 1) * 4)
+
+# VEPRAD names a recording after its speaker: m01020105401.wav is male speaker m01,
+# z03010204401.wav female speaker z03 (žena)
+SPEAKER_CHARS = 3
+GENDER_PREFIX = {'m': 'm', 'z': 'f'}
+
+Entry = namedtuple('Entry', 'file_id path size mtime_ns duration_s sample_rate channels '
+                            'speaker gender transcript_path audio_hash')
+
+def speaker_of(file_id):
+    return file_id[:SPEAKER_CHARS]
+
+def gender_of(file_id, default=None):
+    return GENDER_PREFIX.get(file_id[:1].lower(), default)
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest.get('files', {}) if manifest.get('version') == MANIFEST_VERSION else {}
+
+def save_manifest(path, files):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def probe(wav_path, st):
+    # header fields only, the samples are read once for the content hash
+    try:
+        with wave.open(wav_path, 'rb') as w:
+            n_frames, sample_rate, channels = w.getnframes(), w.getframerate(), w.getnchannels()
+        duration_s = n_frames / sample_rate
+    except (wave.Error, EOFError):
+        # not PCM: still listed, whisper decodes it through ffmpeg
+        duration_s = sample_rate = channels = None
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'duration_s': duration_s,
+            'sample_rate': sample_rate, 'channels': channels, 'audio_hash': file_hash(wav_path)}
+
+def _scan_file(wav_path, known):
+    st = os.stat(wav_path)
+    if known is not None and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+        return known, False
+    return probe(wav_path, st), True
+
+def _entry(path, record):
+    file_id = os.path.splitext(os.path.basename(path))[0]
+    return Entry(file_id, path, record['size'], record['mtime_ns'], record['duration_s'], record['sample_rate'],
+                 record['channels'], record['speaker'], record['gender'], record['transcript_path'], record['audio_hash'])
+
+def scan(sources, manifest_path, workers=SCAN_THREADS):
+    # sources: [(wav_dir, transcript_dir, gender or None to read it from the file name)];
+    # one listing per directory, only new files and files whose size or mtime changed are
+    # probed (in parallel), the rest comes from the manifest; returns [Entry] in path order
+    known = load_manifest(manifest_path)
+    jobs = []
+    for wav_dir, transcript_dir, gender in sources:
+        try:
+            names = sorted(f for f in os.listdir(wav_dir) if f.endswith('.wav'))
+        except FileNotFoundError:
+            print(f"Direktorij '{wav_dir}' nije pronađen.")
+            continue
+        transcripts = set(os.listdir(transcript_dir)) if os.path.isdir(transcript_dir) else set()
+        for name in names:
+            file_id = os.path.splitext(name)[0]
+            transcript = file_id + '.txt'
+            jobs.append((os.path.join(wav_dir, name), {
+                'speaker': speaker_of(file_id),
+                'gender': gender or gender_of(file_id),
+                'transcript_path': os.path.join(transcript_dir, transcript) if transcript in transcripts else None,
+            }))
+
+    files, probed = {}, 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='corpus') as pool:
+        scanned = pool.map(lambda job: _scan_file(job[0], known.get(job[0])), jobs)
+        for (path, names), (record, changed) in zip(jobs, scanned):
+            # speaker, gender and transcript follow the current listing, never the manifest
+            files[path] = {**record, **names}
+            probed += changed
+    save_manifest(manifest_path, files)
+
+    hours = sum(r['duration_s'] or 0.0 for r in files.values()) / 3600
+    print(f"Korpus: {len(files)} datoteka ({hours:.2f} h), pregledano {probed} novih ili promijenjenih, "
+          f"uklonjeno {len(set(known) - set(files))}")
+    return [_entry(path, files[path]) for path, _ in jobs]
+
+def read_manifest(manifest_path):
+    # the entries as of the last scan, for worker processes that must not list the corpus again
+    return [_entry(path, record) for path, record in sorted(load_manifest(manifest_path).items())]
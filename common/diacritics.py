@@ -0,0 +1,62 @@
+import numpy as np
+from common.alignment import opcodes, ref_to_hyp
+
+LETTERS = ['č', 'ć', 'š', 'ž', 'đ']
+# what a reference diacritic can turn into in the hypothesis
+HYP_LABELS = LETTERS + ['c', 's', 'z', 'd', 'ostalo', 'brisanje']
+OTHER = HYP_LABELS.index('ostalo')
+DELETED = HYP_LABELS.index('brisanje')
+
+_LETTER_INDEX = {ch: i for i, ch in enumerate(LETTERS)}
+_HYP_INDEX = {ch: i for i, ch in enumerate(HYP_LABELS[:OTHER])}
+
+def align_chars(ref, hyp):
+    # index of the aligned hypothesis character for every reference character, -1 if deleted
+    return ref_to_hyp(opcodes(ref, hyp), len(ref))
+
+def pair_events(ref, hyp, mapping=None):
+    # (letter, what it became) for every diacritic in ref; mapping can come from
+    # an alignment that was already computed for CER
+    ref, hyp = str(ref).lower(), str(hyp).lower()
+    positions = [i for i, c in enumerate(ref) if c in _LETTER_INDEX]
+    if not positions:
+        return [], []
+    if mapping is None:
+        mapping = align_chars(ref, hyp)
+    letters, labels = [], []
+    for i in positions:
+        j = mapping[i]
+        letters.append(_LETTER_INDEX[ref[i]])
+        labels.append(DELETED if j < 0 else _HYP_INDEX.get(hyp[j], OTHER))
+    return letters, labels
+
+def diacritic_events(refs, hyps):
+    # one entry per reference diacritic: (row, letter, what it became)
+    rows, letters, labels = [], [], []
+    for row, (ref, hyp) in enumerate(zip(refs, hyps)):
+        pair_letters, pair_labels = pair_events(ref, hyp)
+        rows.extend([row] * len(pair_letters))
+        letters.extend(pair_letters)
+        labels.extend(pair_labels)
+    return (np.array(rows, dtype=np.int64),
+            np.array(letters, dtype=np.int64),
+            np.array(labels, dtype=np.int64))
+
+def confusion_counts(refs, hyps, groups=None, n_groups=1):
+    # (n_groups, letters, hyp labels) count array; totals and errors follow from it
+    rows, letters, labels = diacritic_events(refs, hyps)
+    group = np.zeros_like(rows) if groups is None else np.asarray(groups, dtype=np.int64)[rows]
+    flat = (group * len(LETTERS) + letters) * len(HYP_LABELS) + labels
+    counts = np.bincount(flat, minlength=n_groups * len(LETTERS) * len(HYP_LABELS))
+    return counts.reshape(n_groups, len(LETTERS), len(HYP_LABELS))
+
+def totals_and_errors(confusion):
+    total = confusion.sum(axis=-1)
+    correct = np.diagonal(confusion[..., :len(LETTERS)], axis1=-2, axis2=-1)
+    return total, total - correct
+
+def der(ref, hyp, mapping=None):
+    letters, labels = pair_events(ref, hyp, mapping)
+    if not letters:
+        return float('nan')
+    return sum(l != h for l, h in zip(letters, labels)) / len(letters)
@@ -0,0 +1,127 @@
+import os
+import csv
+import sys
+import time
+import wave
+import threading
+from collections import Counter
+
+# per-file cost of every pipeline stage: <stage>_wall_s, <stage>_cpu_s, plus
+# bytes_read, audio_s and rtf once the file is done
+TIMING_COLUMNS = ['model', 'file_id', 'audio_s', 'rtf', 'bytes_read']
+
+def wav_seconds(path):
+    with wave.open(path, 'rb') as w:
+        return w.getnframes() / w.getframerate()
+
+def record(stats, stage, wall, cpu, n_bytes=0):
+    stats[f'{stage}_wall_s'] = stats.get(f'{stage}_wall_s', 0.0) + wall
+    stats[f'{stage}_cpu_s'] = stats.get(f'{stage}_cpu_s', 0.0) + cpu
+    stats['bytes_read'] = stats.get('bytes_read', 0) + n_bytes
+
+class measure:
+    # with measure(stats, 'decode', n_bytes): ...  adds the block's wall and CPU time to stats;
+    # thread_time counts only this thread, so concurrent stages don't inflate each other
+    def __init__(self, stats, stage, n_bytes=0, cpu_clock=time.thread_time):
+        self.stats = stats
+        self.stage = stage
+        self.n_bytes = n_bytes
+        self.cpu_clock = cpu_clock
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = self.cpu_clock()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stats, self.stage, time.perf_counter() - self._wall, self.cpu_clock() - self._cpu, self.n_bytes)
+
+class measure_batch(measure):
+    # one measurement shared equally by every file of a batch
+    def __exit__(self, *exc):
+        share = 1 / max(len(self.stats), 1)
+        wall, cpu = time.perf_counter() - self._wall, self.cpu_clock() - self._cpu
+        for stats in self.stats:
+            record(stats, self.stage, wall * share, cpu * share)
+
+def finish(stats, audio_s):
+    wall = sum(v for k, v in stats.items() if k.endswith('_wall_s'))
+    stats['audio_s'] = audio_s
+    stats['rtf'] = wall / audio_s if audio_s else None
+    return stats
+
+class TimingLog:
+    # sidecar CSV with one row of stage costs per (model, file), written as the rows come
+    # in; only the per-model sums are kept for the real-time factor summary
+    def __init__(self, path, stages):
+        self.path = path
+        columns = TIMING_COLUMNS + [f'{stage}_{kind}' for stage in stages for kind in ('wall_s', 'cpu_s')]
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, restval='', extrasaction='ignore')
+        self._writer.writeheader()
+        self._wall, self._audio, self._files = Counter(), Counter(), Counter()
+
+    def append(self, model, file_id, stats):
+        self._writer.writerow({'model': model, 'file_id': file_id, **stats})
+        self._wall[model] += sum(v for k, v in stats.items() if k.endswith('_wall_s'))
+        self._audio[model] += stats.get('audio_s') or 0.0
+        self._files[model] += 1
+
+    def close(self):
+        self._file.close()
+        print(f"Vremena obrade zapisana u '{self.path}'")
+        for model, n in self._files.items():
+            rtf = self._wall[model] / self._audio[model] if self._audio[model] else float('nan')
+            print(f"  {model}: {n} datoteka, {self._audio[model]:.1f} s zvuka, {self._wall[model]:.1f} s obrade, RTF {rtf:.3f}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StackSampler:
+    # py-spy style sampling profiler: every `interval` seconds the stack of every thread
+    # of this process is recorded; the output is the folded format read by
+    # flamegraph.pl and speedscope ("thread;outer;...;inner count" per line)
+    def __init__(self, path, interval=0.01):
+        self.path = path
+        self.interval = interval
+        self._counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for stack, count in self._counts.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Profil ({sum(self._counts.values())} uzoraka) zapisan u '{self.path}'")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,95 @@
+import os
+import gc
+import sys
+
+try:
+    # RSS of the whole process tree on every platform; without it Linux reads /proc
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+# share of the ceiling at which batches and workers start shrinking
+RSS_HEADROOM = 0.9
+
+def release():
+    # unreachable objects (a dropped model's tensors) are freed now, not at the next
+    # collection, and cached CUDA blocks go back to the driver
+    gc.collect()
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def _proc_rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+def _proc_tree(root_pid):
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # the command name in parentheses may itself contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    tree, frontier = [root_pid], [root_pid]
+    while frontier:
+        found = children.get(frontier.pop(), [])
+        tree.extend(found)
+        frontier.extend(found)
+    return tree
+
+def tree_rss_mb(root_pid=None):
+    # resident memory of a process and every process below it (a run and its workers),
+    # None where it cannot be read
+    root_pid = root_pid or os.getpid()
+    if psutil is not None:
+        try:
+            root = psutil.Process(root_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                # exited between the listing and the read
+                pass
+        return total / MB
+    if not os.path.isdir('/proc'):
+        return None
+    return sum(_proc_rss(pid) for pid in _proc_tree(root_pid)) / MB
+
+class MemoryGuard:
+    # RSS ceiling for a run: root_pid is the main process, its workers count towards the
+    # same ceiling; near it the batch size is halved (and never grows back in that process)
+    def __init__(self, ceiling_mb, root_pid=None, headroom=RSS_HEADROOM):
+        self.ceiling_mb = ceiling_mb
+        self.root_pid = root_pid or os.getpid()
+        self.headroom = headroom
+        self.batch_limit = None
+        if tree_rss_mb(self.root_pid) is None:
+            # a ceiling that is silently not enforced is worse than none
+            raise RuntimeError("RSS se ne može očitati (instalirajte psutil), granica memorije se ne može provesti")
+
+    def near(self):
+        rss = tree_rss_mb(self.root_pid)
+        return rss is not None and rss >= self.ceiling_mb * self.headroom
+
+    def batch_size(self, requested):
+        limit = requested if self.batch_limit is None else min(self.batch_limit, requested)
+        if limit > 1 and self.near():
+            release()
+            if self.near():
+                limit = max(1, limit // 2)
+                print(f"RSS blizu granice od {self.ceiling_mb} MB: batch smanjen na {limit}")
+        self.batch_limit = limit
+        return limit
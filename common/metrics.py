@@ -0,0 +1,56 @@
+from common.alignment import opcodes, counts, ref_to_hyp
+from common.diacritics import der as diacritic_der
+
+# bump whenever scoring or normalization changes what a stored row's metrics or
+# alignment would be; stored rows of another version are scored again from ref and hyp
+SCORING_VERSION = 1
+
+# same chunk names jiwer uses in its alignments
+CHUNK_TYPES = {'equal': 'equal', 'replace': 'substitute', 'delete': 'delete', 'insert': 'insert'}
+
+def _rate(errors, n):
+    if n == 0:
+        return 0.0 if errors == 0 else 1.0
+    return errors / n
+
+def score_pair(ref, hyp, normalize=None):
+    # normalizes once, aligns words once and characters once; WER, CER and DER
+    # all come from these two alignments
+    if normalize is not None:
+        ref, hyp = normalize(ref), normalize(hyp)
+    ref_words, hyp_words = ref.split(), hyp.split()
+    ref_chars, hyp_chars = ' '.join(ref_words), ' '.join(hyp_words)
+
+    word_ops = opcodes(ref_words, hyp_words)
+    char_ops = opcodes(ref_chars, hyp_chars)
+    hits, subs, dels, ins = counts(word_ops)
+    c_hits, c_subs, c_dels, c_ins = counts(char_ops)
+    n_words = hits + subs + dels
+
+    return {
+        'hits':          hits,
+        'substitutions': subs,
+        'deletions':     dels,
+        'insertions':    ins,
+        'n_words':       n_words,
+        'wer':           _rate(subs + dels + ins, n_words),
+        'cer':           _rate(c_subs + c_dels + c_ins, c_hits + c_subs + c_dels),
+        'der':           diacritic_der(ref_chars, hyp_chars, ref_to_hyp(char_ops, len(ref_chars))),
+        'alignment':     [[CHUNK_TYPES[tag], i1, i2, j1, j2] for tag, i1, i2, j1, j2 in word_ops],
+    }
+
+def summarize(scores):
+    # corpus-level counts are sums of the per-file counts, no second alignment pass
+    hits = sum(s['hits'] for s in scores)
+    subs = sum(s['substitutions'] for s in scores)
+    dels = sum(s['deletions'] for s in scores)
+    ins = sum(s['insertions'] for s in scores)
+    n_words = hits + subs + dels
+    return {
+        'hits':          hits,
+        'substitutions': subs,
+        'deletions':     dels,
+        'insertions':    ins,
+        'n_words':       n_words,
+        'wer':           _rate(subs + dels + ins, n_words),
+    }
@@ -0,0 +1,28 @@
+import re
+from functools import lru_cache
+
+# VEPRAD transcripts write Croatian diacritics as ASCII symbols
+CHAR_MAP = {
+    '{': 'š',  # { → š
+    '~': 'č',  # ~ → č
+    '^': 'ć',  # ^ → ć
+    '`': 'ž',  # ` → ž
+    '}': 'đ',  # } → đ
+}
+DIACRITICS_TABLE = str.maketrans(CHAR_MAP)
+
+TAG_RE = re.compile(r"<[^>]*>")
+# tags, bracketed annotations and punctuation removed in one pass
+NOISE_RE = re.compile(r"<[^>]*>|\[[^\]]*\]|[^\w\s]")
+
+def clean_transcript(text):
+    # raw VEPRAD transcript → text with tags removed and diacritics restored
+    return TAG_RE.sub("", text).translate(DIACRITICS_TABLE)
+
+@lru_cache(maxsize=1 << 16)
+def normalize(text):
+    # shared WER/CER/DER normalization for references and hypotheses of every backend
+    return " ".join(NOISE_RE.sub("", text).casefold().split())
+
+def normalize_batch(texts):
+    return [normalize(t) for t in texts]
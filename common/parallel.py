@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+def run_tasks(fn, tasks, workers=1, initializer=None, initargs=()):
+    # yields (task, result) as tasks finish; workers=1 runs in this process
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield task, fn(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        futures = {pool.submit(fn, *task): task for task in tasks}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def run_tasks_limited(fn, tasks, workers, shrink, initializer=None, initargs=()):
+    # like run_tasks, but at most `workers` tasks run at a time and shrink() is asked after
+    # every finished task; when it says yes no new task starts, the pool is drained and
+    # shut down (its processes exit, freeing whatever they had loaded) and the remaining
+    # tasks continue on a pool with one worker less
+    pending = list(tasks)[::-1]
+    while pending:
+        shrinking = False
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+            running = {}
+            while running or (pending and not shrinking):
+                while pending and not shrinking and len(running) < workers:
+                    task = pending.pop()
+                    running[pool.submit(fn, *task)] = task
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future.result()
+                if workers > 1 and not shrinking and shrink():
+                    shrinking = True
+        if shrinking:
+            workers -= 1
+            print(f"Memorija blizu granice: broj procesa smanjen na {workers}")
+
+def merge_stream(keyed_rows, keys):
+    # yields rows in the order of `keys` as soon as each one has arrived,
+    # only rows that came in early are held back
+    keys = iter(keys)
+    pending = {}
+    want = next(keys, None)
+    for key, row in keyed_rows:
+        pending[key] = row
+        while want is not None and want in pending:
+            yield pending.pop(want)
+            want = next(keys, None)
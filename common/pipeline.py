@@ -0,0 +1,142 @@
+import queue
+import threading
+from collections import namedtuple
+
+# fn takes one item, or a list of up to batch_size items and returns a list
+Stage = namedtuple('Stage', 'name fn workers batch_size')
+
+_DONE = object()
+# how often a thread blocked on a queue checks whether the pipeline is stopping
+POLL_SECONDS = 0.1
+
+def stage(name, fn, workers=1, batch_size=None):
+    return Stage(name, fn, max(workers, 1), batch_size)
+
+class _Failure:
+    def __init__(self, stage_name, error):
+        self.stage_name = stage_name
+        self.error = error
+
+def _put(q, item, stop):
+    # False once the pipeline is shutting down, so a full queue never blocks forever
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q, stop):
+    # (_DONE, None) once the pipeline is shutting down
+    while not stop.is_set():
+        try:
+            return q.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return _DONE, None
+
+def _take(q_in, batch_size, stop):
+    # blocks until a full batch is collected or upstream is finished
+    seq, item = _get(q_in, stop)
+    if seq is _DONE:
+        return [], True
+    batch = [(seq, item)]
+    while len(batch) < batch_size:
+        seq, item = _get(q_in, stop)
+        if seq is _DONE:
+            return batch, True
+        batch.append((seq, item))
+    return batch, False
+
+def _worker(st, q_in, q_out, finished, lock, remaining, stop):
+    done = False
+    try:
+        while not done and not stop.is_set():
+            if st.batch_size:
+                batch, done = _take(q_in, st.batch_size, stop)
+                if batch:
+                    outputs = st.fn([item for _, item in batch])
+                    for (seq, _), out in zip(batch, outputs):
+                        _put(q_out, (seq, out), stop)
+            else:
+                seq, item = _get(q_in, stop)
+                if seq is _DONE:
+                    done = True
+                else:
+                    _put(q_out, (seq, st.fn(item)), stop)
+    except Exception as e:
+        # every other thread sees the stop and returns instead of waiting for items
+        # that will never come
+        stop.set()
+        finished.put(_Failure(st.name, e))
+        return
+    if stop.is_set():
+        return
+    # let the other workers of this stage see the end too; the last one closes the stage
+    _put(q_in, (_DONE, None), stop)
+    with lock:
+        remaining[0] -= 1
+        last = remaining[0] == 0
+    if last:
+        _put(q_out, (_DONE, None), stop)
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+def run_pipeline(source, stages, queue_size=16):
+    # every stage runs in its own threads and is connected to the next one by a bounded
+    # queue, so a slow stage holds back the ones before it; outputs come out in source order.
+    # A failing stage (or a consumer that stops early) stops every thread: the queues are
+    # drained and the threads joined before the error is raised
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    finished = queue.Queue()
+    queues.append(finished)
+    stop = threading.Event()
+
+    def feed():
+        try:
+            for seq, item in enumerate(source):
+                if not _put(queues[0], (seq, item), stop):
+                    return
+        except Exception as e:
+            stop.set()
+            finished.put(_Failure('source', e))
+            return
+        _put(queues[0], (_DONE, None), stop)
+
+    threads = [threading.Thread(target=feed, name='source', daemon=True)]
+    for i, st in enumerate(stages):
+        lock, remaining = threading.Lock(), [st.workers]
+        for _ in range(st.workers):
+            threads.append(threading.Thread(
+                target=_worker, args=(st, queues[i], queues[i + 1], finished, lock, remaining, stop),
+                name=st.name, daemon=True
+            ))
+    for t in threads:
+        t.start()
+
+    pending, next_seq = {}, 0
+    try:
+        while True:
+            got = finished.get()
+            if isinstance(got, _Failure):
+                raise RuntimeError(f"Greška u fazi '{got.stage_name}': {got.error}") from got.error
+            seq, out = got
+            if seq is _DONE:
+                break
+            pending[seq] = out
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+    finally:
+        stop.set()
+        for q in queues:
+            _drain(q)
+        # a thread inside a stage function returns once that call does
+        for t in threads:
+            t.join()
@@ -0,0 +1,138 @@
+import os
+import json
+import pickle
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+# batch hosts have no display, never open a window
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+MANIFEST_NAME = ".plots_manifest.json"
+
+# render is one of the module-level functions below, data is everything the plot
+# depends on; the same (render, data, options) is never drawn twice
+FigureSpec = namedtuple('FigureSpec', 'path render data options style')
+
+def figure(path, render, data, style=None, **options):
+    return FigureSpec(path, render, data, options, style)
+
+def bar(data, title, ylabel, xlabel=None, figsize=None):
+    plt.figure(figsize=figsize)
+    plt.bar(data['x'], data['y'])
+    plt.title(title)
+    plt.ylabel(ylabel)
+    if xlabel:
+        plt.xlabel(xlabel)
+
+def grouped_boxplot(data, title, xlabel, ylabel):
+    fig, ax = plt.subplots()
+    ax.boxplot(list(data.values()))
+    ax.set_xticklabels(list(data.keys()))
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+def boxplot(data, y, x=None, hue=None, title="", ylabel=None, xlabel=None, figsize=None, tight=False):
+    plt.figure(figsize=figsize)
+    sns.boxplot(data=data, x=x, y=y, hue=hue)
+    _labels(title, xlabel, ylabel, tight)
+
+def violinplot(data, y, x=None, hue=None, split=False, title="", ylabel=None, xlabel=None, figsize=None):
+    plt.figure(figsize=figsize)
+    sns.violinplot(data=data, x=x, y=y, hue=hue, split=split)
+    _labels(title, xlabel, ylabel, False)
+
+def heatmap(data, title, xlabel, ylabel, figsize=(8, 6)):
+    plt.figure(figsize=figsize)
+    sns.heatmap(data, annot=True, fmt=".0f", cmap="Reds")
+    _labels(title, xlabel, ylabel, True)
+
+def diff_histogram(data, title, xlabel, figsize=(8, 5)):
+    plt.figure(figsize=figsize)
+    sns.histplot(data, bins=30, kde=True)
+    plt.axvline(0, color="black", linestyle="--")
+    _labels(title, xlabel, None, True)
+
+def scatter_compare(data, x, y, hue, title, xlabel, ylabel, figsize=(6, 6)):
+    plt.figure(figsize=figsize)
+    sns.scatterplot(x=data[x], y=data[y], hue=data[hue])
+    plt.plot([0, 1], [0, 1], linestyle="--", color="gray")
+    _labels(title, xlabel, ylabel, True)
+
+def tradeoff(data, x, y, label, hue, title, xlabel, ylabel, figsize=(7, 5)):
+    # one point per model, e.g. mean RTF against mean WER, named next to the point
+    plt.figure(figsize=figsize)
+    sns.scatterplot(data=data, x=x, y=y, hue=hue, s=80)
+    for _, row in data.iterrows():
+        plt.annotate(str(row[label]), (row[x], row[y]), textcoords="offset points", xytext=(5, 5))
+    _labels(title, xlabel, ylabel, True)
+
+def _labels(title, xlabel, ylabel, tight):
+    plt.title(title)
+    if xlabel is not None:
+        plt.xlabel(xlabel)
+    if ylabel is not None:
+        plt.ylabel(ylabel)
+    if tight:
+        plt.tight_layout()
+
+def _digest(spec):
+    payload = pickle.dumps((spec.render.__name__, spec.data, sorted(spec.options.items()), spec.style), protocol=4)
+    return hashlib.sha1(payload).hexdigest()
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _init_worker():
+    matplotlib.use('Agg')
+
+def render_one(spec):
+    if spec.style:
+        with sns.axes_style(spec.style):
+            spec.render(spec.data, **spec.options)
+    else:
+        spec.render(spec.data, **spec.options)
+    plt.savefig(spec.path)
+    plt.close('all')
+    return spec.path
+
+def render_all(specs, workers=None):
+    # plots whose inputs did not change since the last render are skipped
+    manifests, todo = {}, []
+    for spec in specs:
+        out_dir = os.path.dirname(spec.path) or '.'
+        os.makedirs(out_dir, exist_ok=True)
+        manifest = manifests.setdefault(out_dir, _load_manifest(out_dir))
+        digest = _digest(spec)
+        name = os.path.basename(spec.path)
+        if manifest.get(name) != digest or not os.path.exists(spec.path):
+            todo.append((spec, out_dir, name, digest))
+
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers <= 1:
+        for spec, *_ in todo:
+            render_one(spec)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            list(pool.map(render_one, [spec for spec, *_ in todo]))
+
+    for _, out_dir, name, digest in todo:
+        manifests[out_dir][name] = digest
+    for out_dir, manifest in manifests.items():
+        _save_manifest(out_dir, manifest)
+    print(f"Grafovi: iscrtano {len(todo)}, preskočeno {len(specs) - len(todo)} nepromijenjenih")
+    return [spec.path for spec, *_ in todo]
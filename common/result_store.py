@@ -0,0 +1,108 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ResultStore:
+    # one row per (model, file_id, audio_hash), committed as soon as it is written
+    # so a crash loses at most the file that was being transcribed; scoring_version is
+    # the common.metrics.SCORING_VERSION the row's metrics and alignment were computed with
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        # pipeline stages may call the store from different threads
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " model TEXT NOT NULL, file_id TEXT NOT NULL, audio_hash TEXT NOT NULL,"
+                " row TEXT NOT NULL, alignment TEXT, timings TEXT, scoring_version INTEGER,"
+                " PRIMARY KEY (model, file_id, audio_hash))"
+            )
+            columns = [c[1] for c in self._conn.execute("PRAGMA table_info(results)")]
+            for column, kind in [('alignment', 'TEXT'), ('timings', 'TEXT'), ('scoring_version', 'INTEGER')]:
+                if column not in columns:
+                    try:
+                        self._conn.execute(f"ALTER TABLE results ADD COLUMN {column} {kind}")
+                    except sqlite3.OperationalError:
+                        # another worker process migrated the table first
+                        pass
+            self._conn.commit()
+        return self._conn
+
+    def put(self, model, file_id, audio_hash, row, alignment=None, timings=None, scoring_version=None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (model, file_id, audio_hash, row, alignment, timings, scoring_version)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, file_id, audio_hash, json.dumps(row, ensure_ascii=False),
+                 None if alignment is None else json.dumps(alignment),
+                 None if timings is None else json.dumps(timings), scoring_version),
+            )
+            conn.commit()
+
+    def get(self, model, file_id, audio_hash):
+        with self._lock:
+            found = self._connect().execute(
+                "SELECT row FROM results WHERE model = ? AND file_id = ? AND audio_hash = ?",
+                (model, file_id, audio_hash),
+            ).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def load(self, model):
+        with self._lock:
+            cur = self._connect().execute(
+                "SELECT file_id, audio_hash, row FROM results WHERE model = ?", (model,)
+            )
+            return {(fid, h): json.loads(row) for fid, h, row in cur}
+
+    def load_versions(self, model):
+        # scoring version of every row, None for rows written before it was recorded
+        with self._lock:
+            cur = self._connect().execute(
+                "SELECT file_id, audio_hash, scoring_version FROM results WHERE model = ?", (model,)
+            )
+            return {(fid, h): version for fid, h, version in cur}
+
+    def load_alignments(self, model, scoring_version=None):
+        # word alignment chunks kept next to each row so analysis never re-aligns, keyed
+        # like the rows (trimmed and untrimmed audio have alignments of their own); with
+        # scoring_version only alignments computed by that version
+        query = "SELECT file_id, audio_hash, alignment FROM results WHERE model = ? AND alignment IS NOT NULL"
+        params = (model,)
+        if scoring_version is not None:
+            query += " AND scoring_version = ?"
+            params += (scoring_version,)
+        with self._lock:
+            cur = self._connect().execute(query, params)
+            return {(fid, h): json.loads(alignment) for fid, h, alignment in cur}
+
+    def load_timings(self, model):
+        # per-stage cost of the run that produced each row
+        with self._lock:
+            cur = self._connect().execute(
+                "SELECT file_id, audio_hash, timings FROM results WHERE model = ? AND timings IS NOT NULL",
+                (model,),
+            )
+            return {(fid, h): json.loads(timings) for fid, h, timings in cur}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,155 @@
+import os
+import csv
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# results of both backends, one Parquet partition per backend/model:
+# results_dataset/backend=whisper/model=small/part-0.parquet
+DATASET_DIR = 'results_dataset'
+
+METRIC_COLUMNS = ['wer', 'cer', 'der']
+# filled in only by some runs, written as float64 even when a row group has none
+OPTIONAL_FLOAT_COLUMNS = ['rtf', 'fallbacks', 'deletion_rate']
+GENDER_CODES = {'male': 'm', 'female': 'f', 'm': 'm', 'f': 'f'}
+# partitions are read back alphabetically, plots keep this order instead
+MODEL_ORDER = ['small', 'medium', 'large', 'large-int8', 'google']
+
+def partition_dir(root, backend, model):
+    return os.path.join(root, f"backend={backend}", f"model={model}")
+
+class ResultWriter:
+    # streams rows into the Parquet partitions in row groups (and into a CSV when
+    # csv_path is given) so a run never holds all of its rows in memory; a run that
+    # completes leaves only the partitions of the models it wrote under its backend
+    def __init__(self, backend, root=DATASET_DIR, csv_path=None, csv_columns=None, row_group_size=1000):
+        self.backend = backend
+        self.root = root
+        self.row_group_size = row_group_size
+        self._buffers = {}
+        self._writers = {}
+        self._written = set()
+        self._csv_file = None
+        self._csv_writer = None
+        if csv_path is not None:
+            self._csv_file = open(csv_path, 'w', newline='', encoding='utf-8')
+            self._csv_columns = csv_columns
+
+    def append(self, row):
+        if self._csv_file is not None:
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self._csv_columns or list(row), extrasaction='ignore')
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(row)
+
+        model = row.get('model', self.backend)
+        buffer = self._buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= self.row_group_size:
+            self._flush(model)
+
+    def _flush(self, model):
+        buffer = self._buffers.get(model)
+        if not buffer:
+            return
+        df = pd.DataFrame(buffer).drop(columns=['model'], errors='ignore')
+        df['gender'] = pd.Categorical(df['gender'].map(GENDER_CODES), categories=['m', 'f'])
+        for column in METRIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column]).astype('float64')
+        for column in OPTIONAL_FLOAT_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column]).astype('float64')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        writer = self._writers.get(model)
+        if writer is None:
+            out_dir = partition_dir(self.root, self.backend, model)
+            # a rerun replaces the whole partition
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.makedirs(out_dir)
+            writer = pq.ParquetWriter(os.path.join(out_dir, "part-0.parquet"), table.schema)
+            self._writers[model] = writer
+            self._written.add(model)
+        writer.write_table(table.cast(writer.schema))
+        self._buffers[model] = []
+        if self._csv_file is not None:
+            self._csv_file.flush()
+
+    def close(self, prune=True):
+        for model in list(self._buffers):
+            self._flush(model)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        if prune and self._written:
+            self._prune()
+
+    def _prune(self):
+        # e.g. model=large-int8 from an earlier --backend run would otherwise be read
+        # back by the analysis next to this run's models
+        backend_dir = os.path.join(self.root, f"backend={self.backend}")
+        for name in os.listdir(backend_dir):
+            if name.startswith('model=') and name[len('model='):] not in self._written:
+                shutil.rmtree(os.path.join(backend_dir, name), ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # a failed run keeps the partitions it did not get to
+        self.close(prune=exc_type is None)
+
+def _order_models(df):
+    if 'model' in df.columns:
+        models = [str(m) for m in pd.unique(df['model'])]
+        known = [m for m in MODEL_ORDER if m in models]
+        df['model'] = pd.Categorical(df['model'].astype(str), categories=known + sorted(set(models) - set(known)))
+        df = df.sort_values('model', kind='stable', ignore_index=True)
+    return df
+
+def load_results(source=DATASET_DIR, columns=None, backend=None, model=None):
+    # source is a dataset directory or a legacy .csv; only `columns` are read
+    if source.endswith('.csv'):
+        usecols = None if columns is None else lambda c: c in columns
+        df = pd.read_csv(source, usecols=usecols)
+        if 'gender' in df.columns:
+            df['gender'] = pd.Categorical(df['gender'].map(GENDER_CODES), categories=['m', 'f'])
+        return _order_models(df)
+
+    filters = [('model', '==', model)] if model is not None else None
+    path = source if backend is None else os.path.join(source, f"backend={backend}")
+    # backends have columns of their own (whisper's rtf, inference_backend) and older
+    # runs lack newer ones; columns missing from the requested partitions are skipped
+    if columns is not None:
+        names = set(ds.dataset(path, format='parquet', partitioning='hive').schema.names)
+        columns = [c for c in columns if c in names or c == 'backend']
+    if backend is None:
+        return _order_models(pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters))
+    read_columns = None if columns is None else [c for c in columns if c != 'backend']
+    df = pd.read_parquet(path, engine='pyarrow', columns=read_columns, filters=filters)
+    if columns is None or 'backend' in columns:
+        df['backend'] = backend
+    return _order_models(df)
+
+def iter_results(source=DATASET_DIR, columns=None, backend=None, batch_rows=65536):
+    # like load_results, but yields DataFrames of at most batch_rows rows so a result
+    # set of any size is read in bounded memory; columns the source lacks are skipped
+    if source.endswith('.csv'):
+        usecols = None if columns is None else lambda c: c in columns
+        for chunk in pd.read_csv(source, usecols=usecols, chunksize=batch_rows):
+            if 'gender' in chunk.columns:
+                chunk['gender'] = pd.Categorical(chunk['gender'].map(GENDER_CODES), categories=['m', 'f'])
+            yield chunk
+        return
+
+    path = source if backend is None else os.path.join(source, f"backend={backend}")
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+        yield batch.to_pandas()
@@ -0,0 +1,76 @@
+import os
+import time
+import heapq
+
+# shards per worker, smaller shards stream rows back to the parent sooner
+SHARDS_PER_WORKER = 4
+
+def plan(items, duration, n_shards):
+    # longest processing time first: every item, longest first, goes to the shard with the
+    # least audio so far; returns (items in schedule order, [(start, shard)]) where the
+    # shards are contiguous runs of the reordered items.
+    # Shards come heaviest first, so a pool that hands out tasks in order keeps assigning
+    # the longest remaining shard to whichever worker frees up. The order within a shard
+    # is only what LPT leaves behind: Whisper pads every clip to a 30 s window, so it
+    # removes no padding from a batch
+    if not items:
+        return [], []
+    n_shards = max(1, min(n_shards, len(items)))
+    lengths = [duration(item) for item in items]
+    bins, loads = [[] for _ in range(n_shards)], [0.0] * n_shards
+    heap = [(0.0, s) for s in range(n_shards)]
+    for i in sorted(range(len(items)), key=lambda i: -lengths[i]):
+        load, s = heapq.heappop(heap)
+        bins[s].append(i)
+        loads[s] = load + lengths[i]
+        heapq.heappush(heap, (loads[s], s))
+
+    ordered, shards = [], []
+    for s in sorted(range(n_shards), key=lambda s: -loads[s]):
+        shards.append((len(ordered), [items[i] for i in bins[s]]))
+        ordered.extend(shards[-1][1])
+    return ordered, shards
+
+def expected_makespan(loads, workers):
+    # tasks handed out in order to the first free worker (what ProcessPoolExecutor does)
+    finish = [0.0] * max(workers, 1)
+    for load in loads:
+        heapq.heapreplace(finish, finish[0] + load)
+    return max(finish)
+
+def describe(label, shards, duration, workers):
+    loads = [sum(duration(item) for item in shard) for _, shard in shards]
+    if not loads:
+        return
+    total, makespan = sum(loads), expected_makespan(loads, workers)
+    print(f"Raspored {label}: {sum(len(s) for _, s in shards)} isječaka ({total:.0f} s zvuka) u {len(shards)} dijelova "
+          f"za {workers} radnika, dijelovi {min(loads):.0f}–{max(loads):.0f} s, "
+          f"najopterećeniji radnik {makespan:.0f} s zvuka (očekivana iskorištenost {total / max(makespan * workers, 1e-9):.0%})")
+
+def timed_task(fn, *args):
+    # (fn(*args), (pid, start, end)) so the parent can tell which worker was busy when
+    start = time.time()
+    result = fn(*args)
+    return result, (os.getpid(), start, time.time())
+
+class Utilization:
+    # busy time of every worker process against the wall time from the first task
+    # starting to the last one finishing
+    def __init__(self):
+        self.spans = []
+
+    def add(self, span):
+        self.spans.append(span)
+
+    def report(self):
+        if not self.spans:
+            return
+        first = min(start for _, start, _ in self.spans)
+        makespan = max(end for _, _, end in self.spans) - first
+        busy = {}
+        for pid, start, end in self.spans:
+            busy[pid] = busy.get(pid, 0.0) + end - start
+        print(f"Iskorištenost radnika (ukupno {makespan:.1f} s, {len(self.spans)} dijelova):")
+        for pid, seconds in sorted(busy.items()):
+            print(f"  proces {pid}: zauzet {seconds:.1f} s ({seconds / max(makespan, 1e-9):.0%})")
+        print(f"  prosjek: {sum(busy.values()) / (len(busy) * max(makespan, 1e-9)):.0%}")
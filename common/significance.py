@@ -0,0 +1,151 @@
+import os
+import warnings
+from itertools import combinations
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from scipy.stats import wilcoxon, mannwhitneyu
+
+METRICS = ['wer', 'cer', 'der']
+BOOTSTRAP_SAMPLES = 2000
+# resampling weights drawn at a time, replicates × files
+BOOTSTRAP_BLOCK = 1 << 22
+CONFIDENCE = 0.95
+# results are summarized for all files and for each gender separately
+GROUPS = [('sve', None), ('m', 'm'), ('f', 'f')]
+
+# values[metric] is a file × system matrix (NaN where a system has no row for a file);
+# a system is one combination of system_columns, e.g. a model or (model, backend)
+ResultMatrix = namedtuple('ResultMatrix', 'file_ids genders systems values')
+
+def result_matrix(df, system_columns=('model',), metrics=METRICS):
+    # every test below pairs rows by file_id, not by row order; all metrics share one file
+    # index and one system index, so a column is the same system in every matrix even
+    # when a metric has no value for some system (DER without diacritics is all NaN)
+    system_columns = list(system_columns)
+    # systems in category order (results_io orders models), otherwise sorted
+    keys = df[system_columns].drop_duplicates().sort_values(system_columns).astype(str)
+    df = df.assign(file_id=df['file_id'].astype(str), **{c: df[c].astype(str) for c in system_columns})
+    file_index = pd.Index(sorted(df['file_id'].unique()), name='file_id')
+    system_index = pd.MultiIndex.from_frame(keys) if len(system_columns) > 1 else pd.Index(keys[system_columns[0]])
+    wide = df.groupby(['file_id'] + system_columns)[metrics].mean().unstack(system_columns)
+    values = {m: wide[m].reindex(index=file_index, columns=system_index).to_numpy(dtype=np.float64) for m in metrics}
+    genders = df.groupby('file_id')['gender'].first().reindex(file_index).astype(str).to_numpy()
+    systems = ['/'.join(key) if isinstance(key, tuple) else key for key in system_index]
+    return ResultMatrix(file_index.to_numpy(), genders, systems, values)
+
+def bootstrap_means(x, n_samples=BOOTSTRAP_SAMPLES, seed=0):
+    # (n_samples × columns) means of x (files × columns) over resampled files; the same
+    # resampling weights serve every column, so differences between columns stay paired
+    n = x.shape[0]
+    rng = np.random.default_rng(seed)
+    present = ~np.isnan(x)
+    filled, present = np.where(present, x, 0.0), present.astype(np.float64)
+    means = np.empty((n_samples, x.shape[1]))
+    step = max(BOOTSTRAP_BLOCK // max(n, 1), 1)
+    for start in range(0, n_samples, step):
+        size = min(step, n_samples - start)
+        # how often every file was drawn in each replicate (multinomial counts)
+        draws = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+        weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[start:start + size] = (weights @ filled) / (weights @ present)
+    return means
+
+def _intervals(x, n_samples, seed, confidence):
+    means = bootstrap_means(x, n_samples, seed)
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # a column without values has no interval
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+        mean = np.nanmean(x, axis=0)
+    return mean, low, high
+
+def _pvalues(test, *args):
+    with warnings.catch_warnings():
+        # identical columns (all differences zero) give NaN instead of a warning per pair
+        warnings.simplefilter('ignore', RuntimeWarning)
+        try:
+            return test(*args, axis=0, nan_policy='omit').pvalue
+        except ValueError:
+            return np.full(args[0].shape[1], np.nan)
+
+def summarize(matrix, n_samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, seed=0):
+    # returns (intervals, pairs, genders):
+    #   intervals: mean and bootstrap CI of every (group, metric, system)
+    #   pairs:     paired difference b - a with its CI and the Wilcoxon p for every pair of systems
+    #   genders:   Mann–Whitney p of m against f for every (metric, system)
+    systems = np.array(matrix.systems, dtype=object)
+    pair_idx = np.array(list(combinations(range(len(systems)), 2)), dtype=int).reshape(-1, 2)
+    intervals, pairs, genders = [], [], []
+
+    for group, gender in GROUPS:
+        # all metrics, systems and pairs of a group are resampled together in one pass
+        blocks = []
+        for metric, x in matrix.values.items():
+            rows = x if gender is None else x[matrix.genders == gender]
+            a, b = rows[:, pair_idx[:, 0]], rows[:, pair_idx[:, 1]]
+            # only files both systems transcribed enter a pair
+            blocks.append((metric, rows, np.where(np.isnan(a) | np.isnan(b), np.nan, b - a)))
+        if len(blocks[0][1]) == 0:
+            continue
+        mean, low, high = _intervals(np.hstack([c for _, rows, diff in blocks for c in (rows, diff)]),
+                                     n_samples, seed, confidence)
+        offset = 0
+        for metric, rows, diff in blocks:
+            part = slice(offset, offset + rows.shape[1])
+            intervals.append(pd.DataFrame({
+                'group': group, 'metric': metric, 'system': systems, 'n': (~np.isnan(rows)).sum(axis=0),
+                'mean': mean[part], 'ci_low': low[part], 'ci_high': high[part],
+            }))
+            offset += rows.shape[1]
+            part = slice(offset, offset + diff.shape[1])
+            if diff.shape[1]:
+                pairs.append(pd.DataFrame({
+                    'group': group, 'metric': metric, 'a': systems[pair_idx[:, 0]], 'b': systems[pair_idx[:, 1]],
+                    'n': (~np.isnan(diff)).sum(axis=0), 'mean_diff': mean[part], 'ci_low': low[part], 'ci_high': high[part],
+                    'p_wilcoxon': _pvalues(wilcoxon, diff),
+                }))
+            offset += diff.shape[1]
+
+    for metric, x in matrix.values.items():
+        male, female = x[matrix.genders == 'm'], x[matrix.genders == 'f']
+        if len(male) and len(female):
+            with warnings.catch_warnings():
+                # a system without values for the metric has no mean
+                warnings.simplefilter('ignore', RuntimeWarning)
+                mean_m, mean_f = np.nanmean(male, axis=0), np.nanmean(female, axis=0)
+            genders.append(pd.DataFrame({
+                'metric': metric, 'system': systems,
+                'n_m': (~np.isnan(male)).sum(axis=0), 'n_f': (~np.isnan(female)).sum(axis=0),
+                'mean_m': mean_m, 'mean_f': mean_f,
+                'p_mannwhitney': _pvalues(mannwhitneyu, male, female),
+            }))
+
+    concat = lambda frames: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return concat(intervals), concat(pairs), concat(genders)
+
+def report(df, out_dir=None, system_columns=('model',), metrics=METRICS, **options):
+    # pivots once, prints the tables and (with out_dir) writes stats_*.csv; the bootstrap
+    # does not merge, so callers only redo it when some row changed
+    return report_matrix(result_matrix(df, system_columns, metrics), out_dir, **options)
+
+def report_matrix(matrix, out_dir=None, **options):
+    # report() for a ResultMatrix that was assembled without a long table
+    intervals, pairs, genders = summarize(matrix, **options)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.float_format', '{:.4f}'.format):
+        print("=== Srednje vrijednosti s bootstrap intervalima pouzdanosti ===")
+        print(intervals.to_string(index=False), "\n")
+        if not pairs.empty:
+            print("=== Parovi sustava (razlika b - a po istim datotekama, Wilcoxon) ===")
+            print(pairs.to_string(index=False), "\n")
+        if not genders.empty:
+            print("=== Muški vs. ženski govornici (Mann–Whitney U) ===")
+            print(genders.to_string(index=False), "\n")
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        for name, table in [('intervals', intervals), ('pairs', pairs), ('genders', genders)]:
+            table.to_csv(os.path.join(out_dir, f"stats_{name}.csv"), index=False)
+        print(f"Statistike zapisane u '{out_dir}'")
+    return intervals, pairs, genders
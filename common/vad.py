@@ -0,0 +1,100 @@
+import os
+import csv
+import wave
+import numpy as np
+
+# energy VAD: a frame is speech when its RMS (dB relative to full scale) is at least
+# NOISE_MARGIN_DB above the clip's noise floor (its NOISE_PERCENTILE-th quietest frame),
+# within THRESHOLD_DB of the loudest frame and above FLOOR_DB
+FRAME_MS = 30
+NOISE_PERCENTILE = 10
+NOISE_MARGIN_DB = 10.0
+THRESHOLD_DB = -35.0
+FLOOR_DB = -60.0
+# speech kept around the detected region so word onsets and endings aren't clipped
+PAD_MS = 200
+
+# stored next to the audio hash, rows of a trimmed run never mix with untrimmed ones
+TAG = f"vad-{FRAME_MS}-{NOISE_PERCENTILE}-{NOISE_MARGIN_DB:g}-{THRESHOLD_DB:g}-{FLOOR_DB:g}-{PAD_MS}"
+
+def frame_db(audio, sample_rate, frame_ms=FRAME_MS):
+    frame_len = max(int(sample_rate * frame_ms / 1000), 1)
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(0), frame_len
+    frames = np.asarray(audio[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10)), frame_len
+
+def speech_frames(audio, sample_rate, frame_ms=FRAME_MS, noise_margin_db=NOISE_MARGIN_DB,
+                  threshold_db=THRESHOLD_DB, floor_db=FLOOR_DB):
+    db, frame_len = frame_db(audio, sample_rate, frame_ms)
+    if len(db) == 0:
+        return db.astype(bool), frame_len
+    noise = np.percentile(db, NOISE_PERCENTILE)
+    return db >= max(noise + noise_margin_db, db.max() + threshold_db, floor_db), frame_len
+
+def speech_bounds(audio, sample_rate, pad_ms=PAD_MS, **params):
+    # (start, end) sample range from the first to the last speech frame plus padding;
+    # a clip without any speech frame is kept whole
+    speech, frame_len = speech_frames(audio, sample_rate, **params)
+    idx = np.flatnonzero(speech)
+    if len(idx) == 0:
+        return 0, len(audio)
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(idx[0] * frame_len - pad, 0)
+    end = min((idx[-1] + 1) * frame_len + pad, len(audio))
+    return start, end
+
+def trim(audio, sample_rate, **params):
+    start, end = speech_bounds(audio, sample_rate, **params)
+    return audio[start:end]
+
+def read_wav(path):
+    # 16-bit PCM .wav (what VEPRAD ships) → float32 mono in [-1, 1] and its sample rate
+    with wave.open(path, 'rb') as w:
+        sample_rate, n_channels = w.getframerate(), w.getnchannels()
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    if n_channels > 1:
+        pcm = pcm.reshape(-1, n_channels).mean(axis=1)
+    return pcm.astype(np.float32) / 32768.0, sample_rate
+
+def write_wav(path, audio, sample_rate):
+    pcm = np.clip(np.round(audio * 32768.0), -32768, 32767).astype(np.int16)
+    tmp_path = path[:-4] + f".{os.getpid()}.tmp.wav"
+    with wave.open(tmp_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
+    os.replace(tmp_path, path)
+
+def write_report(path, records):
+    # records: (file_id, original_s, trimmed_s)
+    total_original = total_trimmed = 0.0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file_id', 'original_s', 'trimmed_s', 'removed_s'])
+        for file_id, original_s, trimmed_s in records:
+            writer.writerow([file_id, f"{original_s:.3f}", f"{trimmed_s:.3f}", f"{original_s - trimmed_s:.3f}"])
+            total_original += original_s
+            total_trimmed += trimmed_s
+    removed = total_original - total_trimmed
+    share = removed / total_original * 100 if total_original else 0.0
+    print(f"VAD: uklonjeno {removed:.1f} s od {total_original:.1f} s zvuka ({share:.1f}%), izvještaj u '{path}'")
+
+def compare_wer(plain, trimmed, label, tolerance=0.005):
+    # plain/trimmed: {file_id: wer} of the same model without and with trimming;
+    # returns False when the mean WER over the shared files got worse by more than tolerance
+    shared = sorted(set(plain) & set(trimmed))
+    if not shared:
+        print(f"VAD provjera ({label}): nema datoteka obrađenih i bez i s VAD-om")
+        return True
+    before = np.array([plain[f] for f in shared], dtype=float)
+    after = np.array([trimmed[f] for f in shared], dtype=float)
+    worse = int(np.sum(after > before))
+    delta = after.mean() - before.mean()
+    ok = delta <= tolerance
+    print(f"VAD provjera ({label}): WER {before.mean():.4f} → {after.mean():.4f} ({delta:+.4f}) na {len(shared)} datoteka, "
+          f"lošije na {worse}; {'u redu' if ok else 'REGRESIJA'}")
+    return ok
@@ -1,22 +1,40 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import mannwhitneyu
 from collections import Counter
-from tqdm import tqdm
-import jiwer 
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.diacritics import LETTERS, HYP_LABELS, DELETED, totals_and_errors
+from common.aggregates import Aggregates, STATE_NAME
+from common.result_store import ResultStore
+from common.metrics import SCORING_VERSION
+from common.results_io import DATASET_DIR, load_results, partition_dir
+from common import plots, significance
 
 RESULTS_CSV = 'google/evaluation_results.csv'
 OUTPUT_DIR = 'google/analysis_plots/'
-
-def perform_statistical_analysis(df):
+RESULTS_DB = 'google/results.sqlite'
+STORE_MODEL = 'google'
+
+def load_stored_alignments():
+    # alignments were stored by main.py under the same (file_id, audio_hash) as the rows,
+    # so a --vad run never lends its alignments to untrimmed rows; only rows missing from
+    # the store or scored by another scoring version are re-aligned
+    if not os.path.exists(RESULTS_DB):
+        return {}
+    store = ResultStore(RESULTS_DB)
+    stored = store.load_alignments(STORE_MODEL, SCORING_VERSION)
+    store.close()
+    return stored
+
+def perform_statistical_analysis(df, aggregates, changed):
     print("\n" + "="*50)
     print(" STATISTIČKA ANALIZA")
     print("="*50)
 
-    stats = df.groupby('gender')[['wer', 'cer', 'der']].agg(['mean', 'median', 'std'])
-    print("=== Agregirane statistike (srednja vrijednost, medijan, std. dev.) ===")
+    stats = aggregates.moments(['gender'])
+    print("=== Agregirane statistike (broj, srednja vrijednost, std. dev.) ===")
     print(stats, "\n")
 
     min_wer = df['wer'].min()
@@ -24,42 +42,29 @@ def perform_statistical_analysis(df):
     iqr_wer = df['wer'].quantile(0.75) - df['wer'].quantile(0.25)
     print(f"Min WER: {min_wer:.2%}, Max WER: {max_wer:.2%}, IQR WER: {iqr_wer:.2%}\n")
     
-    overall_avg_der = df['der'].mean()
-    print(f"Ukupni prosječni DER (Deletion Error Rate): {overall_avg_der:.2%}\n")
-
-    w_male = df[df['gender'] == 'male']['wer']
-    w_female = df[df['gender'] == 'female']['wer']
-    
-    if not w_male.empty and not w_female.empty:
-        stat, p = mannwhitneyu(w_male, w_female, alternative='two-sided')
-        print(f"=== Mann–Whitney U test (WER muški vs. ženski) ===")
-        print(f"P-vrijednost: {p:.4f}")
+    overall_avg_der = aggregates.moments()[('der', 'mean')].iloc[0]
+    print(f"Ukupni prosječni DER (stopa pogrešaka dijakritika): {overall_avg_der:.2%}\n")
+
+    genders_csv = os.path.join(OUTPUT_DIR, "stats_genders.csv")
+    if changed or not os.path.exists(genders_csv):
+        _, _, genders = significance.report(df.assign(model=STORE_MODEL), OUTPUT_DIR)
+    else:
+        print(f"Statistička značajnost: nema promijenjenih redaka, tablice u '{OUTPUT_DIR}' su aktualne")
+        genders = pd.read_csv(genders_csv)
+    wer = genders[genders['metric'] == 'wer'] if not genders.empty else genders
+    if not wer.empty:
+        p = wer['p_mannwhitney'].iloc[0]
         if p < 0.05:
             print("Zaključak: Postoji statistički značajna razlika u WER-u između spolova.")
         else:
             print("Zaključak: Nema statistički značajne razlike u WER-u između spolova.")
 
-def analyze_word_errors(df):
+def analyze_word_errors(aggregates):
     print("\n" + "="*50)
     print(" ANALIZA NAJČEŠĆIH POGREŠAKA U RIJEČIMA")
     print("="*50)
 
-    references = df['ref'].astype(str).tolist()
-    hypotheses = df['hyp'].astype(str).tolist()
-
-    report = jiwer.process_words(references, hypotheses)
-
-    word_error_counter = Counter()
-    references_as_words = [s.split() for s in references]
-    
-    for alignment_chunks, ref_words in zip(report.alignments, references_as_words):
-        for chunk in alignment_chunks:
-            if chunk.type == 'substitute':
-                ref_segment_words = ref_words[chunk.ref_start_idx:chunk.ref_end_idx]
-                word_error_counter.update(ref_segment_words)
-            elif chunk.type == 'delete':
-                deleted_words = ref_words[chunk.ref_start_idx:chunk.ref_end_idx]
-                word_error_counter.update(deleted_words)
+    word_error_counter = aggregates.error_counter().get((), Counter())
 
     print("\n=== Top 20 riječi na kojima sustav najčešće griješi ===")
     print("(Broj puta koliko je riječ bila supstituirana ili izbrisana)")
@@ -67,92 +72,89 @@ def analyze_word_errors(df):
         print(f"  '{word}': {count} puta")
 
 
-def analyze_diacritics(df):
+def analyze_diacritics(aggregates):
     print("\n" + "="*50)
     print(" ANALIZA GREŠAKA NA DIJAKRITICIMA")
     print("="*50)
 
-    letters = ['č', 'ć', 'š', 'ž', 'đ']
-    total_counts = {ch: 0 for ch in letters}
-    error_counts = {ch: 0 for ch in letters}
-    confusion_pairs = Counter()
-
-    for _, row in tqdm(df.iterrows(), total=df.shape[0], desc="Analiziram dijakritike"):
-        ref = str(row['ref'])
-        hyp = str(row['hyp'])
-        
-        for i, ref_char in enumerate(ref):
-            if ref_char in letters:
-                total_counts[ref_char] += 1
-                hyp_char = hyp[i] if i < len(hyp) else None
-                
-                if ref_char != hyp_char:
-                    error_counts[ref_char] += 1
-                    confusion_pairs[(ref_char, hyp_char)] += 1
-    
-    der_rates = {ch: (error_counts[ch] / total_counts[ch] if total_counts[ch] > 0 else 0) for ch in letters}
+    conf = aggregates.confusion().get((), np.zeros((len(LETTERS), len(HYP_LABELS)), dtype=np.int64))
+    total_counts, error_counts = totals_and_errors(conf)
+
+    der_rates = {ch: (error_counts[i] / total_counts[i] if total_counts[i] > 0 else 0) for i, ch in enumerate(LETTERS)}
     print("\n=== Stopa greške po dijakritičkom znaku (DER per letter) ===")
     for ch, rate in der_rates.items():
         print(f"  Slovo '{ch}': {rate:.2%}")
 
-    plt.figure(figsize=(8, 5))
-    plt.bar(der_rates.keys(), der_rates.values())
-    plt.title("Stopa greške po dijakritiku (DER)")
-    plt.ylabel("Stopa greške (Error Rate)")
-    plt.savefig(os.path.join(OUTPUT_DIR, "der_per_letter.png"))
-    plt.show()
+    figures = [plots.figure(
+        os.path.join(OUTPUT_DIR, "der_per_letter.png"), plots.bar,
+        {'x': list(der_rates.keys()), 'y': [float(r) for r in der_rates.values()]},
+        title="Stopa greške po dijakritiku (DER)", ylabel="Stopa greške (Error Rate)", figsize=(8, 5)
+    )]
 
     print("\n=== Najčešći parovi zabune za dijakritike (Referenca -> Hipoteza) ===")
-    for (ref_c, hyp_c), count in confusion_pairs.most_common(15):
-        print(f"  {ref_c} -> {hyp_c if hyp_c is not None else 'BRISANJE'}: {count} puta")
+    errors_only = conf.copy()
+    np.fill_diagonal(errors_only[:, :len(LETTERS)], 0)
+    for flat in np.argsort(errors_only, axis=None)[::-1][:15]:
+        r, h = np.unravel_index(flat, errors_only.shape)
+        if errors_only[r, h] == 0:
+            break
+        hyp_c = 'BRISANJE' if h == DELETED else HYP_LABELS[h]
+        print(f"  {LETTERS[r]} -> {hyp_c}: {errors_only[r, h]} puta")
+    return figures
 
 def create_visualizations(df):
     print("\n" + "="*50)
     print(" STVARANJE VIZUALIZACIJA")
     print("="*50)
     
-    print("Violinplot za distribuciju WER-a...")
     print(df.head()) 
-    plt.figure(figsize=(8, 6))
-    sns.violinplot(data=df, y='wer', hue='gender', split=True)
-    plt.title("Distribucija WER-a po spolu")
-    plt.ylabel("Stopa pogreške riječi (WER)")
-    plt.xlabel("Spol")
-    plt.savefig(os.path.join(OUTPUT_DIR, "wer_violinplot_gender.png"))
-    plt.show()
-
-    print("Boxplot za usporedbu WER-a...")
-    plt.figure(figsize=(8, 6))
-    sns.boxplot(data=df, x='gender', y='wer')
-    plt.title("Usporedba WER-a po spolu")
-    plt.ylabel("Stopa pogreške riječi (WER)")
-    plt.xlabel("Spol")
-    plt.savefig(os.path.join(OUTPUT_DIR, "wer_boxplot_gender.png"))
-    plt.show()
-
-    print("Boxplot za WER za sve rečenice...")
-    plt.figure(figsize=(8, 6))
-    sns.boxplot(data=df, y='wer')
-    plt.title("Boxplot WER-a za sve rečenice")
-    plt.ylabel("Stopa pogreške riječi (WER)")
-    plt.xlabel("Sve rečenice")
-    plt.savefig(os.path.join(OUTPUT_DIR, "wer_boxplot_all_sentences.png"))
-    plt.show()
-    
+    wer_df = df[['gender', 'wer']]
+    return [
+        plots.figure(
+            os.path.join(OUTPUT_DIR, "wer_violinplot_gender.png"), plots.violinplot,
+            wer_df, y='wer', hue='gender', split=True, title="Distribucija WER-a po spolu",
+            ylabel="Stopa pogreške riječi (WER)", xlabel="Spol", figsize=(8, 6)
+        ),
+        plots.figure(
+            os.path.join(OUTPUT_DIR, "wer_boxplot_gender.png"), plots.boxplot,
+            wer_df, x='gender', y='wer', title="Usporedba WER-a po spolu",
+            ylabel="Stopa pogreške riječi (WER)", xlabel="Spol", figsize=(8, 6)
+        ),
+        plots.figure(
+            os.path.join(OUTPUT_DIR, "wer_boxplot_all_sentences.png"), plots.boxplot,
+            wer_df[['wer']], y='wer', title="Boxplot WER-a za sve rečenice",
+            ylabel="Stopa pogreške riječi (WER)", xlabel="Sve rečenice", figsize=(8, 6)
+        ),
+    ]
+
 def main():
-    if not os.path.exists(RESULTS_CSV):
-        print(f"Greška: Datoteka '{RESULTS_CSV}' nije pronađena.")
+    if os.path.exists(partition_dir(DATASET_DIR, 'google', 'google')):
+        source = DATASET_DIR
+    elif os.path.exists(RESULTS_CSV):
+        source = RESULTS_CSV
+    else:
+        print(f"Greška: Ni '{DATASET_DIR}' ni '{RESULTS_CSV}' nisu pronađeni.")
         return
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
-    print(f"Učitavam rezultate iz '{RESULTS_CSV}'...")
-    df = pd.read_csv(RESULTS_CSV)
+    print(f"Učitavam rezultate iz '{source}'...")
+    df = load_results(source, columns=['gender', 'file_id', 'wer', 'cer', 'der', 'ref', 'hyp', 'audio_hash'], backend='google')
     
-    perform_statistical_analysis(df)
-    analyze_word_errors(df)
-    analyze_diacritics(df)
-    create_visualizations(df)
+    # per-gender sums, diacritic confusions and word errors are kept between runs, only
+    # rows that changed since the last analysis are aligned again; results written before
+    # rows carried their audio_hash cannot be matched to stored alignments and are aligned here
+    keyed = 'audio_hash' in df.columns
+    aggregates = Aggregates(os.path.join(OUTPUT_DIR, STATE_NAME), partition_columns=['gender'],
+                            key_columns=['file_id', 'audio_hash'] if keyed else ['file_id'], word_errors=True)
+    changed = aggregates.update(df, load_stored_alignments if keyed else None)
+
+    perform_statistical_analysis(df, aggregates, changed)
+    analyze_word_errors(aggregates)
+    figures = analyze_diacritics(aggregates)
+    figures += create_visualizations(df)
+    plots.render_all(figures)
+    aggregates.save()
 
     print(f"\nAnaliza završena. Svi grafovi su spremljeni u direktorij '{OUTPUT_DIR}'.")
 
@@ -0,0 +1,130 @@
+import os
+import time
+import random
+import asyncio
+
+SAMPLE_RATE = 16000
+LANGUAGE_CODE = 'hr-HR'
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class GoogleRecognizer:
+    # one SpeechAsyncClient (and gRPC channel) shared by every request of a run; the
+    # channel binds to the loop it is created in, so it is opened on the first request
+    def __init__(self):
+        from google.cloud import speech
+        from google.api_core import exceptions
+        self._speech = speech
+        self._client = None
+        self._config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=SAMPLE_RATE,
+            language_code=LANGUAGE_CODE,
+            enable_automatic_punctuation=False
+        )
+        self._retryable = (
+            exceptions.ServiceUnavailable, exceptions.DeadlineExceeded,
+            exceptions.ResourceExhausted, exceptions.InternalServerError,
+            exceptions.Aborted,
+        )
+
+    def retryable(self, exc):
+        return isinstance(exc, self._retryable)
+
+    async def recognize(self, audio_path, content):
+        if self._client is None:
+            self._client = self._speech.SpeechAsyncClient()
+        audio = self._speech.RecognitionAudio(content=content)
+        response = await self._client.recognize(config=self._config, audio=audio)
+        return response.results[0].alternatives[0].transcript.lower() if response.results else ""
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.transport.close()
+            self._client = None
+
+class StubRecognizer:
+    # offline stand-in: answers with the reference transcript after a simulated latency
+    def __init__(self, transcript_dir=None, latency=0.0, failure_rate=0.0, seed=0):
+        self.transcript_dir = transcript_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def retryable(self, exc):
+        return isinstance(exc, ConnectionError)
+
+    async def close(self):
+        pass
+
+    async def recognize(self, audio_path, content):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise ConnectionError("simulirana greška mreže")
+        if self.transcript_dir is None:
+            return ""
+        # trimmed pieces are named <file>.<key>.<i>.wav
+        basename = os.path.basename(audio_path).split('.')[0]
+        ref_path = os.path.join(self.transcript_dir, basename + '.txt')
+        if not os.path.exists(ref_path):
+            return ""
+        with open(ref_path, 'r', encoding='utf-8') as f:
+            return f.read().strip().lower()
+
+async def transcribe_one(recognizer, audio_path, result_path, semaphore, bucket,
+                         max_retries=5, base_delay=0.5, timings=None):
+    async with semaphore:
+        start = time.perf_counter()
+        content = await asyncio.to_thread(_read_bytes, audio_path)
+        for attempt in range(max_retries + 1):
+            await bucket.acquire()
+            try:
+                hypothesis = await recognizer.recognize(audio_path, content)
+                break
+            except Exception as e:
+                if attempt == max_retries or not recognizer.retryable(e):
+                    print(f"Greška pri transkripciji datoteke {audio_path}: {e}")
+                    return None
+                await asyncio.sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+        if timings is not None:
+            # request latency including rate limiting and retries
+            timings[audio_path] = time.perf_counter() - start
+
+    with open(result_path, 'w', encoding='utf-8') as f:
+        f.write(hypothesis)
+    return hypothesis
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def transcribe_all(jobs, recognizer, max_in_flight=8, rate=10.0, max_retries=5, timings=None):
+    # jobs: list of (audio_path, result_path); results land in the same cache files
+    # get_google_transcription reads, so the scoring loop never calls the API again
+    semaphore = asyncio.Semaphore(max_in_flight)
+    bucket = TokenBucket(rate)
+    try:
+        return await asyncio.gather(*(
+            transcribe_one(recognizer, audio_path, result_path, semaphore, bucket, max_retries, timings=timings)
+            for audio_path, result_path in jobs
+        ))
+    finally:
+        await recognizer.close()
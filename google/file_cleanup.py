@@ -1,29 +1,11 @@
-import os, glob, re
+import os, sys
 
-INPUT_DIR  = r"google\\veprad_transcripts"    
-OUTPUT_DIR = r"google\\veprad_transcripts\\cleaned"  
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cleanup import main
 
-char_map = {
-    '{': 'š',  # { → š
-    '~': 'č',  # ~ → č
-    '^': 'ć',  # ^ → ć
-    '`': 'ž',  # ` → ž
-    '}': 'đ',  # } → đ
-}
+INPUT_DIRS = [
+    os.path.join("google", "veprad_transcripts"),
+]
 
-char_map.update({k.upper(): v.upper() for k, v in char_map.items()})
-translator = str.maketrans(char_map)
-
-for path in glob.glob(os.path.join(INPUT_DIR, "*.txt")):
-    with open(path, encoding="utf-8") as f:
-        text = f.read()
-        
-    text = re.sub(r"<[^>]*>", "", text)
-    text = text.translate(translator)
-    
-    out_path = os.path.join(OUTPUT_DIR, os.path.basename(path))
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(text)
-
-print("Gotovo čišćenje!") 
+if __name__ == "__main__":
+    main(INPUT_DIRS)
@@ -1,32 +1,73 @@
 import os
-import re
-import csv
+import sys
+import math
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from collections import Counter
 from google.cloud import speech
-import jiwer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.parallel import run_tasks, merge_stream
+from common.pipeline import stage, run_pipeline
+from common.metrics import score_pair, summarize, SCORING_VERSION
+from common.normalization import normalize
+from common.result_store import ResultStore
+from common.results_io import DATASET_DIR, ResultWriter
+from common import vad, corpus, scheduling
+from common.chunking import WavChunkCache, stitch
+from common.instrumentation import measure, record, finish, TimingLog, StackSampler
+from async_client import GoogleRecognizer, StubRecognizer, transcribe_all
 
 AUDIO_DIR = 'google/veprad_audio/'
 TRANSCRIPT_DIR = 'google/veprad_transcripts/cleaned/'
 RESULTS_DIR = 'google/results/'
 RESULTS_CSV = 'google/evaluation_results.csv'
+RESULTS_DB = 'google/results.sqlite'
+RESULTS_TIMINGS_CSV = 'google/evaluation_timings.csv'
+CORPUS_MANIFEST = 'google/corpus_manifest.json'
+# chunks of long recordings and --vad trimmed copies, the transcriptions of trimmed audio
+AUDIO_PIECES_DIR = 'google/audio_pieces/'
+RESULTS_VAD_DIR = 'google/results_vad/'
+VAD_REPORT_CSV = 'google/vad_report.csv'
+# the sync recognize API accepts at most one minute of audio, longer recordings are
+# sent as overlapping chunks and the hypotheses stitched
+MAX_SYNC_SECONDS = 55
+STORE_MODEL = 'google'
+RESULTS_DATASET = DATASET_DIR
+# the --stub recognizer answers with the reference transcripts: all of its outputs go
+# under their own prefix so a real run never takes them for cached API results
+STUB_PREFIX = 'google/stub/'
+
+# concurrent sync API calls per process and items waiting between two pipeline stages
+RECOGNIZE_THREADS   = 4
+CHUNK_THREADS       = 4
+PIPELINE_QUEUE_SIZE = 16
+
+SUMMARY_KEYS = ['hits', 'substitutions', 'deletions', 'insertions']
+TIMED_STAGES = ['api', 'reference', 'recognize', 'score']
 
-CHAR_MAP = {
-    '{': 'š',
-    '~': 'č',
-    '^': 'ć',
-    '`': 'ž',
-    '}': 'đ',
-}
+def init_outputs(stub=False):
+    # called in the main process and in every worker, spawned workers start from the
+    # module defaults again
+    global RESULTS_DIR, RESULTS_CSV, RESULTS_DB, RESULTS_TIMINGS_CSV, RESULTS_VAD_DIR, VAD_REPORT_CSV, RESULTS_DATASET
+    if stub and not RESULTS_DIR.startswith(STUB_PREFIX):
+        RESULTS_DIR = STUB_PREFIX + 'results/'
+        RESULTS_VAD_DIR = STUB_PREFIX + 'results_vad/'
+        RESULTS_CSV = STUB_PREFIX + 'evaluation_results.csv'
+        RESULTS_DB = STUB_PREFIX + 'results.sqlite'
+        RESULTS_TIMINGS_CSV = STUB_PREFIX + 'evaluation_timings.csv'
+        VAD_REPORT_CSV = STUB_PREFIX + 'vad_report.csv'
+        RESULTS_DATASET = STUB_PREFIX + 'results_dataset'
 
-CHAR_MAP.update({k.upper(): v.upper() for k, v in CHAR_MAP.items()})
-TRANSLATOR = str.maketrans(CHAR_MAP)
+# one client per process, reused for every file the process handles
+_client = None
 
-def clean_transcript(text):
-    text = text.translate(TRANSLATOR)
-    text = re.sub(r'<[^>]+>', '', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    text = text.lower().strip()
-    return re.sub(r'\s+', ' ', text)
+def get_client():
+    global _client
+    if _client is None:
+        _client = speech.SpeechClient()
+    return _client
 
 def get_google_transcription(audio_path, result_path):
     if os.path.exists(result_path):
@@ -34,7 +75,7 @@ def get_google_transcription(audio_path, result_path):
             return f.read().strip()
 
     print(f"  -> Google API za {os.path.basename(audio_path)}...")
-    client = speech.SpeechClient()
+    client = get_client()
     with open(audio_path, 'rb') as audio_file:
         content = audio_file.read()
 
@@ -55,8 +96,32 @@ def get_google_transcription(audio_path, result_path):
         print(f"Greška pri transkripciji datoteke {audio_path}: {e}")
         return None
 
-def analyze_and_print_summary(references, hypotheses, label):
-    if not references:
+# one store connection per process
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ResultStore(RESULTS_DB)
+    return _store
+
+# file_id → corpus.Entry; the parent scans the corpus, worker processes read its manifest
+_corpus = None
+GENDER_LABELS = {'m': 'male', 'f': 'female'}
+
+def scan_corpus():
+    global _corpus
+    _corpus = {e.file_id: e for e in corpus.scan([(AUDIO_DIR, TRANSCRIPT_DIR, None)], CORPUS_MANIFEST)}
+    return _corpus
+
+def get_entry(audio_filename):
+    global _corpus
+    if _corpus is None:
+        _corpus = {e.file_id: e for e in corpus.read_manifest(CORPUS_MANIFEST)}
+    return _corpus[os.path.splitext(audio_filename)[0]]
+
+def analyze_and_print_summary(scores, label):
+    if not scores:
         print(f"Nema podataka za sažetak za: {label}")
         return
 
@@ -64,90 +129,271 @@ def analyze_and_print_summary(references, hypotheses, label):
     print(f" SAŽETAK REZULTATA ZA: {label.upper()} ")
     print("="*50)
     
-    report = jiwer.process_words(references, hypotheses)
-    
-    total_words_in_reference = report.hits + report.substitutions + report.deletions
+    report = summarize(scores)
+
+    print(f"Ukupna stopa pogreške riječi (WER): {report['wer'] * 100:.2f}%")
+    print(f"Broj supstitucija (S): {report['substitutions']}")
+    print(f"Broj delecija (D): {report['deletions']}")
+    print(f"Broj insercija (I): {report['insertions']}")
+    print(f"Ukupan broj riječi u referenci (N): {report['n_words']}")
 
-    print(f"Ukupna stopa pogreške riječi (WER): {report.wer * 100:.2f}%")
-    print(f"Broj supstitucija (S): {report.substitutions}")
-    print(f"Broj delecija (D): {report.deletions}")
-    print(f"Broj insercija (I): {report.insertions}")
-    print(f"Ukupan broj riječi u referenci (N): {total_words_in_reference}")
+def load_reference(audio_filename):
+    entry = get_entry(audio_filename)
+    basename, transcript_path = entry.file_id, entry.transcript_path
+    if transcript_path is None:
+        return None
+
+    stats = {}
+    with measure(stats, 'reference', os.path.getsize(transcript_path)):
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            reference_text = normalize(f.read())
+    return audio_filename, basename, reference_text, stats
+
+# one cache of audio pieces (untrimmed and trimmed) and one chunk thread pool per process
+_piece_caches = {}
+_chunk_pool = None
+
+def get_piece_cache(trim=False):
+    if trim not in _piece_caches:
+        _piece_caches[trim] = WavChunkCache(AUDIO_PIECES_DIR, MAX_SYNC_SECONDS, trim=trim)
+    return _piece_caches[trim]
+
+def get_chunk_pool():
+    global _chunk_pool
+    if _chunk_pool is None:
+        _chunk_pool = ThreadPoolExecutor(CHUNK_THREADS, thread_name_prefix='chunk')
+    return _chunk_pool
 
-def main():
-    os.makedirs(RESULTS_DIR, exist_ok=True)
+def recognition_jobs(audio_filename, trim=False):
+    # [(audio_path, result_path)] sent for one file: the file itself, or its trimmed copy
+    # and/or overlapping chunks of it when it is longer than the sync API accepts;
+    # a piece's name carries its cache key, so other cut points never reuse its result
+    basename = os.path.splitext(audio_filename)[0]
+    audio_path = os.path.join(AUDIO_DIR, audio_filename)
+    duration_s = get_entry(audio_filename).duration_s
+    # an unknown duration (a header the corpus scan could not read) takes the long path,
+    # which reads the audio itself and cuts it only if it is too long
+    if not trim and duration_s is not None and duration_s <= MAX_SYNC_SECONDS:
+        return [(audio_path, os.path.join(RESULTS_DIR, basename + '.txt'))]
+    results_dir = RESULTS_VAD_DIR if trim else RESULTS_DIR
+    return [(path, os.path.join(results_dir, os.path.basename(path)[:-4] + '.txt'))
+            for path in get_piece_cache(trim).get(audio_path)['segments']]
+
+def recognize(entry, trim=False):
+    if entry is None:
+        return None
+    audio_filename, basename, reference_text, stats = entry
+    print(f"Obrađujem: {audio_filename}...")
+    jobs = recognition_jobs(audio_filename, trim)
+    # a cached result is read instead of sending the audio
+    n_bytes = sum(os.path.getsize(result_path) if os.path.exists(result_path) else os.path.getsize(audio_path)
+                  for audio_path, result_path in jobs)
+    with measure(stats, 'recognize', n_bytes):
+        if len(jobs) == 1:
+            hypotheses = [get_google_transcription(*jobs[0])]
+        else:
+            # the chunks of one long recording are recognized concurrently
+            hypotheses = list(get_chunk_pool().map(lambda job: get_google_transcription(*job), jobs))
+    if None in hypotheses:
+        return None
+    return entry, stitch(hypotheses)
+
+def score_file(entry, trim=False):
+    if entry is None:
+        return None
+    (audio_filename, basename, reference_text, stats), hypothesis_text = entry
+    with measure(stats, 'score'):
+        scores = score_pair(reference_text, hypothesis_text, normalize)
     
-    male_references, male_hypotheses = [], []
-    female_references, female_hypotheses = [], []
+    n_words = scores['n_words']
+    
+    wer = scores['wer']
+    cer = scores['cer']
+    # diacritic error rate, left empty for a reference without diacritics
+    der = scores['der']
+    # share of reference words the recognizer dropped (what the der column used to hold)
+    deletion_rate = scores['deletions'] / n_words if n_words > 0 else 0.0
+    
+    gender = GENDER_LABELS.get(get_entry(audio_filename).gender, "female")
+    
+    row_data = [
+        gender, basename,
+        f"{wer:.4f}", f"{cer:.4f}", None if math.isnan(der) else f"{der:.4f}", f"{deletion_rate:.4f}",
+        reference_text, hypothesis_text, audio_key(audio_filename, trim)
+    ]
+    alignment = scores.pop('alignment')
+    return audio_filename, stats, row_data, scores, alignment
 
-    try:
-        audio_files = [f for f in os.listdir(AUDIO_DIR) if f.endswith('.wav')]
-    except FileNotFoundError:
+def audio_key(audio_filename, trim=False):
+    # trimmed audio is a different input: its rows are stored under their own key
+    audio_hash = get_entry(audio_filename).audio_hash
+    return f"{audio_hash}:{vad.TAG}" if trim else audio_hash
+
+def store_row(entry, trim=False):
+    if entry is None:
+        return None
+    audio_filename, stats, row_data, scores, alignment = entry
+    audio_path = os.path.join(AUDIO_DIR, audio_filename)
+    get_store().put(STORE_MODEL, row_data[1], row_data[-1], row_data, alignment, scoring_version=SCORING_VERSION)
+    audio_s = get_entry(audio_filename).duration_s
+    if trim or audio_s is None:
+        piece = get_piece_cache(trim).get(audio_path)
+        audio_s = piece['trimmed_s'] if trim else piece['original_s']
+    return row_data, scores, finish(stats, audio_s)
+
+def file_rows(start, filenames, trim=False):
+    # reference → recognition → scoring → store as a threaded pipeline with bounded
+    # queues, several requests are in flight while earlier files are being scored;
+    # yields (index, (row_data, scores, stats)) or (index, None) for skipped files
+    stages = [
+        stage('reference', load_reference),
+        stage('recognize', lambda entry: recognize(entry, trim), RECOGNIZE_THREADS),
+        stage('score', lambda entry: score_file(entry, trim)),
+        stage('store', lambda entry: store_row(entry, trim)),
+    ]
+    for i, result in enumerate(run_pipeline(filenames, stages, PIPELINE_QUEUE_SIZE)):
+        yield start + i, result
+
+def process_shard(start, filenames, trim=False):
+    # the whole shard at once, with the time span it took
+    return scheduling.timed_task(lambda: list(file_rows(start, filenames, trim)))
+
+def prefetch_transcriptions(audio_files, recognizer, max_in_flight=8, rate=10.0, trim=False):
+    jobs, owners = [], []
+    for audio_filename in audio_files:
+        if get_entry(audio_filename).transcript_path is None:
+            continue
+        for audio_path, result_path in recognition_jobs(audio_filename, trim):
+            if not os.path.exists(result_path):
+                jobs.append((audio_path, result_path))
+                owners.append(audio_filename)
+
+    if not jobs:
+        return set(), {}
+    print(f"Asinkrona transkripcija {len(jobs)} datoteka (najviše {max_in_flight} istovremeno, {rate} zahtjeva/s)...")
+    timings = {}
+    hypotheses = asyncio.run(transcribe_all(jobs, recognizer, max_in_flight, rate, timings=timings))
+    failed = {owner for owner, hyp in zip(owners, hypotheses) if hyp is None}
+    api_timings = Counter()
+    for owner, (audio_path, _) in zip(owners, jobs):
+        api_timings[owner] += timings.get(audio_path, 0.0)
+    return failed, api_timings
+
+def save_vad_report(audio_files):
+    records = []
+    for audio_filename in audio_files:
+        index = get_piece_cache(True).get(os.path.join(AUDIO_DIR, audio_filename))
+        records.append((os.path.splitext(audio_filename)[0], index['original_s'], index['trimmed_s']))
+    vad.write_report(VAD_REPORT_CSV, records)
+
+def check_vad(audio_files):
+    # WER of the stored untrimmed rows against the trimmed ones
+    store = ResultStore(RESULTS_DB)
+    done = store.load(STORE_MODEL)
+    store.close()
+    plain, trimmed = {}, {}
+    for audio_filename in audio_files:
+        for key, wers in [(audio_key(audio_filename), plain), (audio_key(audio_filename, True), trimmed)]:
+            row = done.get((os.path.splitext(audio_filename)[0], key))
+            if row is not None:
+                wers[row[1]] = float(row[2])
+    return vad.compare_wer(plain, trimmed, STORE_MODEL)
+
+def main(workers=1, recognizer=None, max_in_flight=8, rate=10.0, export_csv=True, trim=False, vad_check=False):
+    stub = isinstance(recognizer, StubRecognizer)
+    init_outputs(stub)
+    os.makedirs(RESULTS_VAD_DIR if trim else RESULTS_DIR, exist_ok=True)
+
+    if not os.path.isdir(AUDIO_DIR):
         print(f"Direktorij '{AUDIO_DIR}' nije pronađen. Molimo provjerite putanju.")
         return
+    # worker processes read the manifest written here instead of probing the files again
+    audio_files = [os.path.basename(e.path) for e in scan_corpus().values()]
 
     print(f"Pronađeno {len(audio_files)} audio datoteka za obradu.")
     print(f"Detaljni rezultati će biti zapisani u datoteku: '{RESULTS_CSV}'")
 
-    csv_header = ['gender', 'file_id', 'wer', 'cer', 'der', 'ref', 'hyp']
+    api_timings = {}
+    if recognizer is not None:
+        # files that failed after all retries are left out instead of hitting the sync API
+        failed, api_timings = prefetch_transcriptions(audio_files, recognizer, max_in_flight, rate, trim)
+        audio_files = [f for f in audio_files if f not in failed]
 
-    with open(RESULTS_CSV, 'w', newline='', encoding='utf-8') as csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(csv_header)
+    # audio_hash is the store key of the row (tagged for trimmed audio), analysis.py
+    # matches stored alignments by it
+    csv_header = ['gender', 'file_id', 'wer', 'cer', 'der', 'deletion_rate', 'ref', 'hyp', 'audio_hash']
+    # longest recordings first, shards balanced by audio duration (common/scheduling.py)
+    duration = lambda audio_filename: get_entry(audio_filename).duration_s or 0.0
+    audio_files, shards = scheduling.plan(audio_files, duration, workers * scheduling.SHARDS_PER_WORKER if workers > 1 else 1)
 
-        for audio_filename in sorted(audio_files):
-            basename = os.path.splitext(audio_filename)[0]
-            audio_path = os.path.join(AUDIO_DIR, audio_filename)
-            transcript_path = os.path.join(TRANSCRIPT_DIR, basename + '.txt')
-            result_path = os.path.join(RESULTS_DIR, basename + '.txt')
+    utilization = scheduling.Utilization()
+    if workers > 1:
+        scheduling.describe(STORE_MODEL, shards, duration, workers)
+        tasks = [(start, chunk, trim) for start, chunk in shards]
 
-            if not os.path.exists(transcript_path):
-                continue
-
-            print(f"Obrađujem: {audio_filename}...")
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                reference_text = clean_transcript(f.read())
+        def keyed_rows():
+            for _, (rows, span) in run_tasks(process_shard, tasks, workers, init_outputs, (stub,)):
+                utilization.add(span)
+                yield from rows
+        # rows come back in completion order, written in schedule order
+        results = merge_stream(keyed_rows(), range(len(audio_files)))
+    else:
+        results = (result for _, result in file_rows(0, audio_files, trim))
 
-            hypothesis_text = get_google_transcription(audio_path, result_path)
-            if hypothesis_text is None:
+    # only the S/D/I counts are kept per gender, every row goes straight to disk
+    totals = {'male': Counter(), 'female': Counter()}
+    csv_path = RESULTS_CSV if export_csv else None
+    with ResultWriter('google', root=RESULTS_DATASET, csv_path=csv_path, csv_columns=csv_header) as writer, \
+            TimingLog(RESULTS_TIMINGS_CSV, TIMED_STAGES) as timing_log:
+        for audio_filename, result in zip(audio_files, results):
+            if result is None:
                 continue
+            row_data, scores, stats = result
+            totals[row_data[0]].update({k: scores[k] for k in SUMMARY_KEYS})
+            writer.append(dict(zip(csv_header, row_data)))
+            if audio_filename in api_timings:
+                # async requests ran before the pipeline, recognize only read their result
+                record(stats, 'api', api_timings[audio_filename], 0.0)
+                finish(stats, stats['audio_s'])
+            timing_log.append(STORE_MODEL, row_data[1], stats)
+    print(f"Rezultati su zapisani u Parquet skup '{RESULTS_DATASET}'")
+    utilization.report()
+    if trim:
+        save_vad_report(audio_files)
 
-            word_report = jiwer.process_words(reference_text, hypothesis_text)
-            char_report = jiwer.process_characters(reference_text, hypothesis_text)
-            
-            n_words = word_report.hits + word_report.substitutions + word_report.deletions
-            
-            wer = word_report.wer
-            cer = char_report.cer
-            der = word_report.deletions / n_words if n_words > 0 else 0.0
-            
-            gender = "male" if audio_filename.startswith('m') else "female"
-            
-            row_data = [
-                gender, basename,
-                f"{wer:.4f}", f"{cer:.4f}", f"{der:.4f}",
-                reference_text, hypothesis_text
-            ]
-            csv_writer.writerow(row_data)
-
-            if gender == "male":
-                male_references.append(reference_text)
-                male_hypotheses.append(hypothesis_text)
-            else:
-                female_references.append(reference_text)
-                female_hypotheses.append(hypothesis_text)
-
-    all_references = male_references + female_references
-    all_hypotheses = male_hypotheses + female_hypotheses
-    
-    analyze_and_print_summary(male_references, male_hypotheses, "Muški govornici")
-    analyze_and_print_summary(female_references, female_hypotheses, "Ženski govornici")
-    analyze_and_print_summary(all_references, all_hypotheses, "Ukupno (svi govornici)")
+    male_scores = [totals['male']] if totals['male'] else []
+    female_scores = [totals['female']] if totals['female'] else []
+    analyze_and_print_summary(male_scores, "Muški govornici")
+    analyze_and_print_summary(female_scores, "Ženski govornici")
+    analyze_and_print_summary(male_scores + female_scores, "Ukupno (svi govornici)")
 
-    print(f"\nObrada završena. Detaljni rezultati su spremljeni u '{RESULTS_CSV}'")
+    print(f"\nObrada završena. Detaljni rezultati su spremljeni u '{RESULTS_CSV if export_csv else RESULTS_DATASET}'")
+    return check_vad(audio_files) if vad_check else True
 
 if __name__ == '__main__':
-    if 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
+    parser = argparse.ArgumentParser(description="Evaluacija Google Speech-to-Text modela")
+    parser.add_argument('--workers', type=int, default=1, help="broj procesa za paralelnu evaluaciju")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="asinkroni klijent s jednim kanalom, ograničenjem brzine i ponovnim pokušajima")
+    parser.add_argument('--stub', action='store_true', help="lokalni lažni prepoznavač umjesto Google API-ja (bez mreže)")
+    parser.add_argument('--no-csv', action='store_true', help="ne zapisuj evaluation_results.csv (samo Parquet skup rezultata)")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="najveći broj istovremenih zahtjeva")
+    parser.add_argument('--rate', type=float, default=10.0, help="najveći broj zahtjeva po sekundi")
+    parser.add_argument('--profile', default=None, help="uzorkuj stogove svih dretvi glavnog procesa u datoteku (folded format za flamegraph)")
+    parser.add_argument('--vad', action='store_true', help="šalji zvuk bez tišine na početku i kraju")
+    parser.add_argument('--vad-check', action='store_true', help="usporedi WER spremljenih rezultata bez i s --vad (izlazni kod 1 ako je lošiji)")
+    args = parser.parse_args()
+
+    sampler = StackSampler(args.profile).start() if args.profile else None
+    ok = True
+    if args.stub:
+        ok = main(max(args.workers, 1), StubRecognizer(TRANSCRIPT_DIR), args.max_in_flight, args.rate, not args.no_csv, args.vad, args.vad_check)
+    elif 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
         print("Greška: Varijabla okruženja 'GOOGLE_APPLICATION_CREDENTIALS' nije postavljena.")
+    elif args.use_async:
+        ok = main(max(args.workers, 1), GoogleRecognizer(), args.max_in_flight, args.rate, not args.no_csv, args.vad, args.vad_check)
     else:
-        main()
\ No newline at end of file
+        ok = main(max(args.workers, 1), export_csv=not args.no_csv, trim=args.vad, vad_check=args.vad_check)
+    if sampler is not None:
+        sampler.stop()
+    if ok is False:
+        sys.exit(1)
\ No newline at end of file
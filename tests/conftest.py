@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts import common/ from the repository root and their whisper/ and benchmarks/
+# siblings directly
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'whisper'), os.path.join(root, 'benchmarks')]
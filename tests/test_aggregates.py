@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from common.aggregates import Aggregates
+from common.metrics import score_pair
+
+REFS = ["čaša je puna", "žaba skače", "kuća na brdu", "šuma i đak", "more je mirno"]
+HYPS = ["casa je puna", "žaba skače", "kuca na brdu", "suma i dak", "more mirno"]
+
+def results(model='small', hyps=HYPS, genders='mfmfm'):
+    rows = []
+    for i, (ref, hyp) in enumerate(zip(REFS, hyps)):
+        m = score_pair(ref, hyp)
+        rows.append({'model': model, 'file_id': f"f{i}", 'gender': genders[i],
+                     'wer': m['wer'], 'cer': m['cer'], 'der': m['der'], 'ref': ref, 'hyp': hyp})
+    return pd.DataFrame(rows)
+
+def fresh(tmp_path, df, word_errors=True):
+    aggregates = Aggregates(str(tmp_path / "fresh.pkl"), word_errors=word_errors)
+    aggregates.update(df)
+    return aggregates
+
+def assert_same(a, b):
+    pd.testing.assert_frame_equal(a.moments(['model', 'gender']), b.moments(['model', 'gender']))
+    for key, conf in a.confusion(['model']).items():
+        np.testing.assert_array_equal(conf, b.confusion(['model'])[key])
+    assert a.error_counter(['model']) == b.error_counter(['model'])
+
+def test_moments_match_pandas(tmp_path):
+    df = pd.concat([results(), results('large', REFS)], ignore_index=True)
+    aggregates = Aggregates(str(tmp_path / "state.pkl"))
+    aggregates.update(df)
+    moments = aggregates.moments(['model', 'gender'])
+    expected = df.groupby(['model', 'gender'])[['wer', 'cer', 'der']].agg(['count', 'mean', 'std'])
+    for metric in ['wer', 'cer', 'der']:
+        np.testing.assert_array_equal(moments[(metric, 'n')], expected.loc[moments.index, (metric, 'count')])
+        np.testing.assert_allclose(moments[(metric, 'mean')], expected.loc[moments.index, (metric, 'mean')])
+        np.testing.assert_allclose(moments[(metric, 'std')], expected.loc[moments.index, (metric, 'std')])
+
+def test_changed_rows_are_subtracted_and_added_again(tmp_path):
+    path = str(tmp_path / "state.pkl")
+    first = Aggregates(path, word_errors=True)
+    first.update(results())
+    first.save()
+
+    # one hypothesis changes and one file moves to the other gender
+    hyps = list(HYPS)
+    hyps[0] = "čaša je puna"
+    changed = results(hyps=hyps, genders='ffmfm')
+    incremental = Aggregates(path, word_errors=True)
+    assert incremental.update(changed) == {('small', 'm'), ('small', 'f')}
+    assert_same(incremental, fresh(tmp_path, changed))
+
+    # a removed row takes its whole contribution with it
+    fewer = changed.iloc[1:]
+    assert incremental.update(fewer) == {('small', 'f')}
+    assert_same(incremental, fresh(tmp_path, fewer))
+
+    # nothing changed, nothing is touched
+    assert incremental.update(fewer) == set()
+
+def test_removing_every_row_of_a_partition(tmp_path):
+    aggregates = Aggregates(str(tmp_path / "state.pkl"))
+    aggregates.update(pd.concat([results(), results('large')], ignore_index=True))
+    aggregates.update(results())
+    assert {key[0] for key in aggregates.partitions} == {'small'}
+    assert_same(aggregates, fresh(tmp_path, results(), word_errors=False))
+
+def test_stored_alignments_are_used(tmp_path):
+    aggregates = Aggregates(str(tmp_path / "state.pkl"), partition_columns=['gender'],
+                            key_columns=['file_id'], word_errors=True)
+    # a stored alignment that marks the first word of f0 as deleted
+    stored = {('f0',): [['delete', 0, 1, 0, 0], ['equal', 1, 3, 0, 2]]}
+    aggregates.update(results(), lambda: stored)
+    words = aggregates.error_counter()[()]
+    assert words['čaša'] == 1
+
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import torch
+import whisper
+from whisper.model import Whisper, ModelDimensions
+import batched
+from batched import transcribe_files, transcribe_single
+from evaluation import TINY_DIMS, load_fixtures
+from common import vad
+from common.metrics import score_pair
+from common.normalization import normalize
+
+N_FILES = 6
+
+@pytest.fixture(scope='module')
+def model():
+    # random weights that actually produce text: a strong encoder so the text depends
+    # on the audio, and a short text context so every decode stops within 16 tokens
+    torch.manual_seed(0)
+    model = Whisper(ModelDimensions(**dict(TINY_DIMS, n_text_ctx=32)))
+    with torch.no_grad():
+        for name, p in model.named_parameters():
+            p.normal_(std=0.3 if name.startswith('encoder') else 0.05)
+    return model.eval()
+
+@pytest.fixture(scope='module')
+def clips():
+    # bundled whisper/test clips at 16 kHz, plus one over 30 s that only the per-file
+    # path can decode
+    clips = []
+    for fid, wav_path, txt_path in load_fixtures(N_FILES):
+        audio, sample_rate = vad.read_wav(wav_path)
+        assert sample_rate == whisper.audio.SAMPLE_RATE
+        with open(txt_path, encoding='utf-8') as f:
+            clips.append((audio, f.read().strip()))
+    long_audio = np.concatenate([audio for audio, _ in clips] * 4)
+    assert len(long_audio) > whisper.audio.N_SAMPLES
+    clips.append((long_audio, ' '.join(ref for _, ref in clips)))
+    return clips
+
+# the sampling presets draw random tokens on fallback, only the deterministic ones
+# can give identical output
+@pytest.mark.parametrize('preset', ['greedy', 'beam5'])
+def test_batched_matches_per_file(model, clips, preset, monkeypatch):
+    audios = [audio for audio, _ in clips]
+    single = transcribe_files(model, audios, 1, 'hr', preset)
+    redone = []
+    def counted(model, audio, *args):
+        redone.append(len(audio))
+        return transcribe_single(model, audio, *args)
+    monkeypatch.setattr(batched, 'transcribe_single', counted)
+    batched_fallbacks = []
+    hyps = transcribe_files(model, audios, 4, 'hr', preset, batched_fallbacks)
+    assert any(hyps[:-1])
+    # the short clips are finished by the batched decode, only the long one is redone
+    assert redone == [len(audios[-1])]
+    assert hyps == single
+    for (_, ref), b, s in zip(clips, hyps, single):
+        b_scores, s_scores = score_pair(ref, b, normalize), score_pair(ref, s, normalize)
+        assert {k: b_scores[k] for k in ('wer', 'cer', 'der')} == pytest.approx(
+            {k: s_scores[k] for k in ('wer', 'cer', 'der')}, nan_ok=True)
+    assert batched_fallbacks == [0] * len(audios)
+
+def test_single_clip_batch(model, clips):
+    audio = clips[0][0]
+    assert transcribe_files(model, [audio], 4, 'hr', 'greedy') == [transcribe_single(model, audio, 'hr', 'greedy')]
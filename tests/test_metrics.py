@@ -0,0 +1,49 @@
+import math
+import jiwer
+import pytest
+from common.metrics import score_pair, summarize
+from common.normalization import normalize
+
+PAIRS = [
+    ("jutro će biti sunčano uz slab vjetar", "jutro ce biti sunčano slab vjetar danas"),
+    ("kiša na jugu", "kiša na jugu"),
+    ("đak žuri kući", "dak zuri kuci i"),
+]
+
+@pytest.mark.parametrize('ref, hyp', PAIRS)
+def test_rates_match_jiwer(ref, hyp):
+    scores = score_pair(ref, hyp)
+    words = jiwer.process_words(ref, hyp)
+    assert (scores['hits'], scores['substitutions'], scores['deletions'], scores['insertions']) == \
+        (words.hits, words.substitutions, words.deletions, words.insertions)
+    assert scores['n_words'] == len(ref.split())
+    assert scores['wer'] == pytest.approx(words.wer)
+    assert scores['cer'] == pytest.approx(jiwer.cer(ref, hyp))
+
+def test_alignment_chunks():
+    scores = score_pair("a b c d", "a x c")
+    assert scores['alignment'] == [['equal', 0, 1, 0, 1], ['substitute', 1, 2, 1, 2],
+                                   ['equal', 2, 3, 2, 3], ['delete', 3, 4, 3, 3]]
+
+def test_der():
+    # č and ž lose their diacritics, ć is kept, š is deleted with its word
+    assert score_pair("čaj ćup ž šuma", "caj ćup z")['der'] == pytest.approx(3 / 4)
+    assert score_pair("đak", "đak")['der'] == 0.0
+    assert score_pair("kiša", "kisa")['der'] == 1.0
+    # no diacritic in the reference: no DER
+    assert math.isnan(score_pair("more", "mora")['der'])
+
+def test_normalize_applied_to_both():
+    scores = score_pair("Kiša, na JUGU.", "kiša na jugu", normalize)
+    assert scores['wer'] == 0.0 and scores['cer'] == 0.0
+
+def test_empty_reference():
+    assert score_pair("", "")['wer'] == 0.0
+    assert score_pair("", "nešto")['wer'] == 1.0
+
+def test_summarize_sums_counts():
+    scores = [score_pair(ref, hyp) for ref, hyp in PAIRS]
+    total = summarize(scores)
+    words = jiwer.process_words([r for r, _ in PAIRS], [h for _, h in PAIRS])
+    assert total['n_words'] == sum(s['n_words'] for s in scores)
+    assert total['wer'] == pytest.approx(words.wer)
@@ -0,0 +1,26 @@
+import threading
+import pytest
+from common.pipeline import stage, run_pipeline
+
+def test_outputs_in_source_order():
+    stages = [stage('double', lambda x: 2 * x, 3), stage('batch', lambda batch: batch, 1, 4)]
+    assert list(run_pipeline(range(200), stages, 4)) == [2 * x for x in range(200)]
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_failure_stops_every_thread(workers):
+    def fail(x):
+        if x == 50:
+            raise ValueError("bad item")
+        return x
+    before = threading.active_count()
+    stages = [stage('a', lambda x: x, workers), stage('b', fail, workers), stage('c', lambda batch: batch, 1, 4)]
+    with pytest.raises(RuntimeError, match="'b'"):
+        list(run_pipeline(range(1000), stages, 4))
+    assert threading.active_count() == before
+
+def test_consumer_stopping_early():
+    before = threading.active_count()
+    rows = run_pipeline(range(1000), [stage('a', lambda x: x, 2)], 4)
+    assert next(rows) == 0
+    rows.close()
+    assert threading.active_count() == before
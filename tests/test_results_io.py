@@ -0,0 +1,28 @@
+import pytest
+from common.results_io import ResultWriter, load_results
+
+def rows(model, n=3):
+    return [{'model': model, 'file_id': f"f{i}", 'gender': 'mf'[i % 2], 'wer': 0.1, 'cer': 0.05, 'der': 0.0}
+            for i in range(n)]
+
+def write(root, models):
+    with ResultWriter('whisper', root=str(root)) as writer:
+        for model in models:
+            for row in rows(model):
+                writer.append(row)
+
+def test_stale_partitions_are_removed(tmp_path):
+    write(tmp_path, ['small', 'large', 'large-int8'])
+    write(tmp_path, ['small', 'large'])
+    df = load_results(str(tmp_path), backend='whisper')
+    assert sorted(df['model'].astype(str).unique()) == ['large', 'small']
+    assert len(df) == 6
+
+def test_failed_run_keeps_partitions(tmp_path):
+    write(tmp_path, ['small', 'large-int8'])
+    with pytest.raises(RuntimeError):
+        with ResultWriter('whisper', root=str(tmp_path)) as writer:
+            writer.append(rows('small')[0])
+            raise RuntimeError
+    df = load_results(str(tmp_path), backend='whisper')
+    assert set(df['model'].astype(str)) == {'small', 'large-int8'}
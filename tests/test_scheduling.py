@@ -0,0 +1,54 @@
+import random
+from common.scheduling import plan, expected_makespan
+
+def loads(shards, duration):
+    return [sum(duration(item) for item in shard) for _, shard in shards]
+
+def test_every_item_once_in_contiguous_shards():
+    items = list(range(37))
+    ordered, shards = plan(items, lambda i: (i * 7) % 11 + 1, 5)
+    assert sorted(ordered) == items
+    assert len(shards) == 5
+    start = 0
+    for shard_start, shard in shards:
+        assert shard_start == start
+        assert ordered[start:start + len(shard)] == shard
+        start += len(shard)
+
+def test_shards_heaviest_first_and_items_longest_first():
+    durations = {i: d for i, d in enumerate([5, 1, 9, 3, 3, 7, 2, 8])}
+    _, shards = plan(list(durations), durations.get, 3)
+    shard_loads = loads(shards, durations.get)
+    assert shard_loads == sorted(shard_loads, reverse=True)
+    for _, shard in shards:
+        assert [durations[i] for i in shard] == sorted((durations[i] for i in shard), reverse=True)
+
+def test_lpt_balances_loads():
+    # one long clip and many short ones: the heaviest shard got its last clip while it was
+    # the lightest, so no two shards differ by more than one short clip; contiguous shards
+    # of the input order are worse
+    rng = random.Random(0)
+    durations = [60.0] + [rng.uniform(1, 10) for _ in range(99)]
+    _, shards = plan(list(range(100)), durations.__getitem__, 4)
+    shard_loads = loads(shards, durations.__getitem__)
+    assert max(shard_loads) - min(shard_loads) <= 10.0
+
+    contiguous = [sum(durations[s:s + 25]) for s in range(0, 100, 25)]
+    assert expected_makespan(shard_loads, 4) < expected_makespan(contiguous, 4)
+
+def test_known_optimum():
+    # LPT finds the optimal 2-way split here: 7+4 and 6+5
+    durations = [7, 6, 5, 4]
+    _, shards = plan(durations, float, 2)
+    assert sorted(loads(shards, float)) == [11, 11]
+
+def test_small_inputs():
+    assert plan([], float, 4) == ([], [])
+    ordered, shards = plan([3.0, 1.0], float, 8)
+    assert ordered == [3.0, 1.0] and len(shards) == 2
+
+def test_expected_makespan():
+    # tasks go to the first free worker in order
+    assert expected_makespan([4, 3, 2, 1], 2) == 5
+    assert expected_makespan([10, 1, 1, 1], 3) == 10
+    assert expected_makespan([2, 2], 1) == 4
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from common.significance import result_matrix, summarize, bootstrap_means
+
+def results(der=True):
+    rng = np.random.default_rng(1)
+    rows = []
+    for i in range(40):
+        file_id, gender = f"f{i:02d}", 'm' if i % 2 else 'f'
+        wer = rng.uniform(0.1, 0.5)
+        for model, shift in [('small', 0.0), ('large', -0.05)]:
+            rows.append({'model': model, 'file_id': file_id, 'gender': gender, 'wer': wer + shift,
+                         'cer': wer / 2, 'der': wer / 4 if der else np.nan})
+        # medium transcribed only every other file
+        if i % 2 == 0:
+            rows.append({'model': 'medium', 'file_id': file_id, 'gender': gender, 'wer': wer + 0.1,
+                         'cer': wer / 2, 'der': np.nan})
+    return pd.DataFrame(rows)
+
+def test_result_matrix_shape():
+    matrix = result_matrix(results())
+    assert matrix.systems == ['large', 'medium', 'small']
+    assert list(matrix.file_ids) == sorted(matrix.file_ids)
+    for x in matrix.values.values():
+        assert x.shape == (40, 3)
+    # medium has a row for half the files and no DER at all
+    assert np.isnan(matrix.values['wer'][:, 1]).sum() == 20
+    assert np.isnan(matrix.values['der'][:, 1]).all()
+    assert not np.isnan(matrix.values['der'][:, [0, 2]]).any()
+
+def test_result_matrix_all_nan_metric():
+    matrix = result_matrix(results(der=False))
+    assert matrix.values['der'].shape == matrix.values['wer'].shape == (40, 3)
+    assert np.isnan(matrix.values['der']).all()
+
+def test_result_matrix_systems_aligned_across_metrics():
+    df = results()
+    df['backend'] = np.where(df['model'] == 'large', 'ct2', 'torch')
+    matrix = result_matrix(df, ('model', 'backend'))
+    assert matrix.systems == ['large/ct2', 'medium/torch', 'small/torch']
+    small = df[df['model'] == 'small'].set_index('file_id').loc[matrix.file_ids]
+    np.testing.assert_allclose(matrix.values['wer'][:, 2], small['wer'])
+    np.testing.assert_allclose(matrix.values['cer'][:, 2], small['cer'])
+
+def test_paired_intervals():
+    intervals, pairs, genders = summarize(result_matrix(results()), n_samples=500)
+    pair = pairs[(pairs['group'] == 'sve') & (pairs['metric'] == 'wer')].set_index(['a', 'b'])
+    # large is small - 0.05 on every file, so every resample gives the same difference
+    row = pair.loc[('large', 'small')]
+    assert row['n'] == 40
+    np.testing.assert_allclose([row['mean_diff'], row['ci_low'], row['ci_high']], 0.05)
+    # only the files both systems transcribed are paired
+    row = pair.loc[('medium', 'small')]
+    assert row['n'] == 20
+    np.testing.assert_allclose([row['mean_diff'], row['ci_low'], row['ci_high']], -0.1)
+    wer = intervals[(intervals['group'] == 'sve') & (intervals['metric'] == 'wer')].set_index('system')
+    assert (wer['ci_low'] <= wer['mean']).all() and (wer['mean'] <= wer['ci_high']).all()
+    assert set(intervals['group']) == {'sve', 'm', 'f'}
+    assert len(genders) == 3 * 3
+
+def test_bootstrap_means():
+    rng = np.random.default_rng(2)
+    x = rng.uniform(0, 1, size=(200, 3))
+    x[:, 1] = 0.25
+    x[::4, 2] = np.nan
+    means = bootstrap_means(x, n_samples=1000, seed=3)
+    assert means.shape == (1000, 3)
+    np.testing.assert_array_equal(bootstrap_means(x, n_samples=1000, seed=3), means)
+    # a constant column stays constant, missing values are left out of every mean
+    np.testing.assert_allclose(means[:, 1], 0.25)
+    assert not np.isnan(means).any()
+    np.testing.assert_allclose(means.mean(axis=0), np.nanmean(x, axis=0), atol=0.01)
+    # the standard error of a mean of 200 uniform values
+    np.testing.assert_allclose(means[:, 0].std(), x[:, 0].std() / np.sqrt(200), rtol=0.15)
+
+def test_bootstrap_means_blocks(monkeypatch):
+    # replicates are drawn in blocks of BOOTSTRAP_BLOCK weights; every block is filled
+    import common.significance as significance
+    monkeypatch.setattr(significance, 'BOOTSTRAP_BLOCK', 7 * 50)
+    x = np.arange(50, dtype=np.float64)[:, None]
+    means = significance.bootstrap_means(x, n_samples=100)
+    assert means.shape == (100, 1) and not np.isnan(means).any()
+    assert len(np.unique(means)) > 50
+
+def test_result_matrix_keeps_category_order():
+    df = results()
+    df['model'] = pd.Categorical(df['model'], categories=['small', 'medium', 'large'])
+    assert result_matrix(df).systems == ['small', 'medium', 'large']
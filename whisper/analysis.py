@@ -1,11 +1,16 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import analysis_helpers.diacritics_hm, analysis_helpers.visualisations, analysis_helpers.model_compare
-import os
+from common.results_io import DATASET_DIR
 
-os.makedirs("whisper\\test\\whisper_outputs\\analysis_plots", exist_ok=True)
-os.makedirs("google\\analysis_plots", exist_ok=True)
-os.makedirs("comparison", exist_ok=True)
+# plots are rendered in worker processes, which re-import this file on Windows
+if __name__ == '__main__':
+    os.makedirs("whisper\\test\\whisper_outputs\\analysis_plots", exist_ok=True)
+    os.makedirs("google\\analysis_plots", exist_ok=True)
+    os.makedirs("comparison", exist_ok=True)
 
-analysis_helpers.diacritics_hm.diacritic_confusion("whisper\\test\\whisper_outputs\\metrics.csv", "whisper\\test\\whisper_outputs\\analysis_plots\\diacritic_heatmap.png")
-analysis_helpers.visualisations.plot_metrics("whisper\\test\\whisper_outputs\\metrics.csv", "whisper\\test\\whisper_outputs\\analysis_plots")
+    # metrics.csv / evaluation_results.csv paths work here as well
+    analysis_helpers.diacritics_hm.diacritic_confusion(DATASET_DIR, "whisper\\test\\whisper_outputs\\analysis_plots\\diacritic_heatmap.png", backend="whisper")
+    analysis_helpers.visualisations.plot_metrics(DATASET_DIR, "whisper\\test\\whisper_outputs\\analysis_plots", backend="whisper")
 
-analysis_helpers.model_compare.compare_model_outputs("whisper\\test\whisper_outputs\metrics.csv", "google\evaluation_results.csv", "comparison")
\ No newline at end of file
+    analysis_helpers.model_compare.compare_model_outputs(DATASET_DIR, DATASET_DIR, "comparison")
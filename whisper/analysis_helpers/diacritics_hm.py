@@ -1,35 +1,21 @@
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from collections import Counter
+import os
 import numpy as np
+import pandas as pd
+from common.diacritics import LETTERS, HYP_LABELS
+from common.aggregates import Aggregates, STATE_NAME, METRICS
+from common.results_io import load_results
+from common import plots
 
-hr_diacritics = ['č','ć','š','ž','đ','Č','Ć','Š','Ž','Đ']
-
-def diacritic_confusion(csv_path, save_path="diacritic_heatmap.png"):
-    df = pd.read_csv(csv_path)
-    matrix = {d: Counter() for d in hr_diacritics}
-
-    for _, row in df.iterrows():
-        ref = row['ref']
-        hyp = row['hyp']
-        for i, c in enumerate(ref):
-            if c in hr_diacritics:
-                wrong = hyp[i] if i < len(hyp) else "_"
-                matrix[c][wrong] += 1
-
-    labels = sorted(hr_diacritics)
-    data = np.zeros((len(labels), len(labels)))
-    for i, d1 in enumerate(labels):
-        for j, d2 in enumerate(labels):
-            data[i, j] = matrix[d1][d2]
+def diacritic_confusion(source, save_path="diacritic_heatmap.png", backend=None):
+    # confusion counts are kept next to the plot, only new or changed rows are aligned
+    df = load_results(source, columns=['model', 'file_id', 'gender', 'ref', 'hyp'] + METRICS, backend=backend)
+    aggregates = Aggregates(os.path.join(os.path.dirname(save_path), STATE_NAME))
+    aggregates.update(df)
+    data = aggregates.confusion().get((), np.zeros((len(LETTERS), len(HYP_LABELS)), dtype=np.int64))
 
-    dfm = pd.DataFrame(data, index=labels, columns=labels)
-    plt.figure(figsize=(8,6))
-    sns.heatmap(dfm, annot=True, fmt=".0f", cmap="Reds")
-    plt.title("Zamjene dijakritika (Ref → Pogrešan)")
-    plt.xlabel("Pogrešan znak")
-    plt.ylabel("Ispravan znak")
-    plt.tight_layout()
-    plt.savefig(save_path)
-    plt.close()
+    dfm = pd.DataFrame(data, index=LETTERS, columns=HYP_LABELS)
+    plots.render_all([plots.figure(
+        save_path, plots.heatmap, dfm,
+        title="Zamjene dijakritika (Ref → Pogrešan)", xlabel="Pogrešan znak", ylabel="Ispravan znak"
+    )], workers=1)
+    aggregates.save()
@@ -1,50 +1,135 @@
+import warnings
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-sns.set(style="ticks")
-
-def compare_model_outputs(whisper_csv, google_csv, save_dir="plots"):
-    w = pd.read_csv(whisper_csv)
-    g = pd.read_csv(google_csv)
-
-    w = w.rename(columns={"wer": "wer_w", "cer": "cer_w", "der": "der_w", "hyp": "hyp_w"})
-    g = g.rename(columns={"wer": "wer_g", "cer": "cer_g", "der": "der_g", "hyp": "hyp_g"})
-
-    # in g convert male to m and female to f
-    g['gender'] = g['gender'].map({'male': 'm', 'female': 'f'})
-    
-
-    #print("Whisper:")
-    #print(w.head())
-    #print("\nGoogle:")
-    #print(g.head())
-    df = pd.merge(w, g, on=["file_id", "gender", "ref"])
-    #df = pd.merge(w, g, on=["file_id", "ref"])
-    print(df.head())
-    print(df.columns)
-    df["wer_diff"] = df["wer_g"] - df["wer_w"]
-    df["cer_diff"] = df["cer_g"] - df["cer_w"]
-    df["der_diff"] = df["der_g"] - df["der_w"]
-
-    for metric in ["wer", "cer", "der"]:
-        plt.figure(figsize=(8, 5))
-        sns.histplot(df[f"{metric}_diff"], bins=30, kde=True)
-        plt.axvline(0, color="black", linestyle="--")
-        plt.title(f"Razlika {metric.upper()} (Google - Whisper)")
-        plt.xlabel(f"{metric.upper()} razlika")
-        plt.tight_layout()
-        plt.savefig(f"{save_dir}/{metric}_diff_hist.png")
-        plt.close()
-
-        plt.figure(figsize=(6, 6))
-        sns.scatterplot(x=df[f"{metric}_w"], y=df[f"{metric}_g"], hue=df["gender"])
-        plt.plot([0, 1], [0, 1], linestyle="--", color="gray")
-        plt.xlabel(f"Whisper {metric.upper()}")
-        plt.ylabel(f"Google {metric.upper()}")
-        plt.title(f"{metric.upper()} usporedba po isječku")
-        plt.tight_layout()
-        plt.savefig(f"{save_dir}/{metric}_scatter.png")
-        plt.close()
-
-    return df
\ No newline at end of file
+from common.results_io import iter_results, MODEL_ORDER
+from common import plots, significance
+
+METRICS = ["wer", "cer", "der"]
+GENDERS = np.array(["m", "f"])
+# rows read at a time from either side
+BATCH_ROWS = 65536
+
+def google_index(google_source, batch_rows=BATCH_ROWS):
+    # file_id → dense integer key over Google's rows; its metrics and gender are kept
+    # as arrays in key order, the text columns are never read
+    ids, values, genders = [], [], []
+    for chunk in iter_results(google_source, ["file_id", "gender"] + METRICS, "google", batch_rows):
+        ids.append(chunk["file_id"].astype(str).to_numpy())
+        values.append(chunk[METRICS].to_numpy(dtype=np.float64))
+        genders.append(chunk["gender"].cat.codes.to_numpy(dtype=np.int8))
+    if not ids:
+        return pd.Index([], dtype=str), np.zeros((0, len(METRICS))), np.zeros(0, dtype=np.int8)
+    index = pd.Index(np.concatenate(ids))
+    values, genders = np.concatenate(values), np.concatenate(genders)
+    if not index.is_unique:
+        # a file evaluated twice keeps its last row
+        keep = ~index.duplicated(keep="last")
+        index, values, genders = index[keep], values[keep], genders[keep]
+    return index, values, genders
+
+def join_whisper(whisper_source, index, batch_rows=BATCH_ROWS):
+    # streams Whisper's rows and scatters each chunk into one dense files × metrics array
+    # per model, addressed by Google's integer keys, so memory grows with the number of
+    # Google files and models, never with the number of rows read; returns
+    # {model: (values, present)} and {model: (inference backend, rtf sum, rtf count)}
+    joined, speed = {}, {}
+    columns = ["model", "inference_backend", "file_id", "rtf"] + METRICS
+    for chunk in iter_results(whisper_source, columns, "whisper", batch_rows):
+        # CSV chunks keep counting the row index, positions are needed below
+        chunk = chunk.reset_index(drop=True)
+        chunk_keys = index.get_indexer(chunk["file_id"].astype(str))
+        for model, rows in chunk.groupby(chunk["model"].astype(str), sort=False, observed=True):
+            keys = chunk_keys[rows.index]
+            found = keys >= 0
+            if model not in joined:
+                joined[model] = (np.full((len(index), len(METRICS)), np.nan), np.zeros(len(index), dtype=bool))
+            values, present = joined[model]
+            # a file evaluated twice keeps its last row, as on Google's side
+            values[keys[found]] = rows[METRICS].to_numpy(dtype=np.float64)[found]
+            present[keys[found]] = True
+            if "rtf" in rows.columns:
+                backend, total, count = speed.get(model, (None, 0.0, 0))
+                if "inference_backend" in rows.columns:
+                    backend = rows["inference_backend"].iloc[0]
+                rtf = rows["rtf"].to_numpy(dtype=np.float64)
+                speed[model] = (backend, total + np.nansum(rtf), count + int(np.sum(~np.isnan(rtf))))
+    return joined, speed
+
+def _model_order(models):
+    known = [m for m in MODEL_ORDER if m in models]
+    return known + sorted(set(models) - set(known))
+
+def gender_labels(codes):
+    # category codes of Google's gender column; -1 (no gender) stays missing
+    return np.where(codes >= 0, GENDERS[np.maximum(codes, 0)], None)
+
+def compare_model_outputs(whisper_source, google_source, save_dir="plots", workers=None):
+    # every Whisper model on its own against Google's row of the same file_id; rows are
+    # joined on integer keys, never on text, neither side is loaded whole and the joined
+    # rows are never collected into one table; returns the mean differences per model
+    index, g_values, g_genders = google_index(google_source)
+    joined, speed = join_whisper(whisper_source, index)
+    models = _model_order(list(joined))
+    genders = gender_labels(g_genders)
+
+    summary, figures = [], []
+    for model in models:
+        values, present = joined[model]
+        keys = np.flatnonzero(present)
+        w_values, g_part = values[keys], g_values[keys]
+        with np.errstate(invalid="ignore"):
+            diffs = g_part - w_values
+        with warnings.catch_warnings():
+            # a metric without values (DER of references without diacritics) has no mean
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean_diffs, means = np.nanmean(diffs, axis=0), np.nanmean(w_values, axis=0)
+        print(f"{model}: {len(keys)} datoteka zajedničkih s Googleom, "
+              + ", ".join(f"razlika {m.upper()} {mean_diffs[i]:+.4f}" for i, m in enumerate(METRICS)))
+        summary.append({"model": model, "n": len(keys),
+                        **{f"{m}_w": means[i] for i, m in enumerate(METRICS)},
+                        **{f"{m}_diff": mean_diffs[i] for i, m in enumerate(METRICS)}})
+
+        for i, metric in enumerate(METRICS):
+            figures.append(plots.figure(
+                f"{save_dir}/{metric}_diff_hist_{model}.png", plots.diff_histogram,
+                pd.Series(diffs[:, i], name=f"{metric}_diff"), style="ticks",
+                title=f"Razlika {metric.upper()} (Google - Whisper {model})", xlabel=f"{metric.upper()} razlika"
+            ))
+            figures.append(plots.figure(
+                f"{save_dir}/{metric}_scatter_{model}.png", plots.scatter_compare,
+                pd.DataFrame({f"{metric}_w": w_values[:, i], f"{metric}_g": g_part[:, i], "gender": genders[keys]}), style="ticks",
+                x=f"{metric}_w", y=f"{metric}_g", hue="gender", title=f"{metric.upper()} usporedba po isječku ({model})",
+                xlabel=f"Whisper {model} {metric.upper()}", ylabel=f"Google {metric.upper()}"
+            ))
+    if not any(row["n"] for row in summary):
+        print("Nema datoteka s rezultatima i Whispera i Googlea")
+        return pd.DataFrame()
+
+    # every Whisper model and Google against each other, paired by file_id: the file ×
+    # system matrices are assembled straight from the per-model arrays
+    matrix = significance.ResultMatrix(
+        index.to_numpy(), genders, models + ["google"],
+        {m: np.column_stack([joined[model][0][:, i] for model in models] + [g_values[:, i]])
+         for i, m in enumerate(METRICS)})
+    significance.report_matrix(matrix, save_dir)
+
+    # speed against accuracy per Whisper model and inference backend
+    rows = []
+    for row in summary:
+        backend, total, count = speed.get(row["model"], (None, 0.0, 0))
+        if count:
+            rows.append({"model": row["model"], "inference_backend": backend, "rtf": total / count,
+                         "wer_w": row["wer_w"], "der_w": row["der_w"]})
+    if rows:
+        speed_df = pd.DataFrame(rows)
+        print(speed_df.to_string(index=False))
+        for metric in ["wer", "der"]:
+            figures.append(plots.figure(
+                f"{save_dir}/{metric}_vs_rtf.png", plots.tradeoff,
+                speed_df[["model", "inference_backend", "rtf", f"{metric}_w"]], style="ticks",
+                x="rtf", y=f"{metric}_w", label="model", hue="inference_backend",
+                title=f"Brzina i {metric.upper()} po modelu", xlabel="RTF (manje je brže)", ylabel=f"Prosječni {metric.upper()}"
+            ))
+    plots.render_all(figures, workers)
+
+    return pd.DataFrame(summary)
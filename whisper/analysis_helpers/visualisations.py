@@ -1,22 +1,20 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+from common.results_io import load_results
+from common import plots
 
-sns.set(style="whitegrid")
-
-def plot_metrics(csv_path, save_dir="plots"):
-    df = pd.read_csv(csv_path)
+def plot_metrics(source, save_dir="plots", backend=None, workers=None):
+    df = load_results(source, columns=['model', 'gender', 'wer', 'cer', 'der'], backend=backend)
     metrics = ['wer', 'cer', 'der']
+    figures = []
     for metric in metrics:
-        plt.figure(figsize=(8, 5))
-        sns.boxplot(data=df, x="model", y=metric, hue="gender")
-        plt.title(f"{metric.upper()} po modelu i spolu")
-        plt.ylabel(metric.upper())
-        plt.xlabel("Model")
-        plt.tight_layout()
-        plt.savefig(f"{save_dir}/{metric}_by_model_gender.png")
-        plt.close()
+        figures.append(plots.figure(
+            os.path.join(save_dir, f"{metric}_by_model_gender.png"), plots.boxplot,
+            df[['model', 'gender', metric]], style="whitegrid",
+            x="model", y=metric, hue="gender", title=f"{metric.upper()} po modelu i spolu",
+            ylabel=metric.upper(), xlabel="Model", figsize=(8, 5), tight=True
+        ))
+    plots.render_all(figures, workers)
 
-def summary_stats(csv_path):
-    df = pd.read_csv(csv_path)
-    return df.groupby(['model', 'gender'])[['wer', 'cer', 'der']].mean().round(3)
+def summary_stats(source, backend=None):
+    df = load_results(source, columns=['model', 'gender', 'wer', 'cer', 'der'], backend=backend)
+    return df.groupby(['model', 'gender'], observed=True)[['wer', 'cer', 'der']].mean().round(3)
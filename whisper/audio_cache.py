@@ -0,0 +1,68 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import whisper
+from common import vad
+
+class AudioCache:
+    def __init__(self, cache_dir, max_resident_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_resident_bytes = max_resident_bytes
+        self._resident = OrderedDict()
+        self._resident_bytes = 0
+        # decode threads of the pipeline share one cache
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, wav_path, trim=False):
+        st = os.stat(wav_path)
+        key = f"{os.path.abspath(wav_path)}:{st.st_size}:{st.st_mtime_ns}"
+        if trim:
+            key += f":{vad.TAG}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".npy")
+
+    def _decode(self, wav_path, npy_path, trim=False, read=None):
+        if trim:
+            # trimmed from the cached full decode, leading/trailing silence never reaches the model
+            audio = np.asarray(vad.trim(self.get(wav_path, read=read), whisper.audio.SAMPLE_RATE))
+        else:
+            # ffmpeg decode happens only here, once per file version
+            audio = whisper.load_audio(wav_path).astype(np.float32, copy=False)
+            if read is not None:
+                read.append(os.path.getsize(wav_path))
+        tmp_path = npy_path[:-4] + f".{os.getpid()}.tmp.npy"
+        np.save(tmp_path, audio)
+        os.replace(tmp_path, npy_path)
+
+    def get(self, wav_path, trim=False, read=None):
+        # read, when given, gets the bytes this call read from disk (none for a resident hit)
+        key = (wav_path, trim)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key]
+
+        npy_path = self._cache_path(wav_path, trim)
+        if not os.path.exists(npy_path):
+            self._decode(wav_path, npy_path, trim, read)
+
+        # copy-on-write mapping so torch.from_numpy gets a writable buffer
+        audio = np.load(npy_path, mmap_mode='c')
+        if read is not None:
+            read.append(os.path.getsize(npy_path))
+        with self._lock:
+            if key not in self._resident:
+                self._resident[key] = audio
+                self._resident_bytes += audio.nbytes
+
+            while self._resident_bytes > self.max_resident_bytes and len(self._resident) > 1:
+                _, old = self._resident.popitem(last=False)
+                self._resident_bytes -= old.nbytes
+        return audio
+
+    def clear(self):
+        with self._lock:
+            self._resident.clear()
+            self._resident_bytes = 0
@@ -0,0 +1,48 @@
+import torch
+from torch import nn
+import whisper
+from whisper.model import Linear as WhisperLinear
+
+# inference backend of a model, picked by the suffix of its name in MODELS:
+# "large" runs the stock PyTorch Whisper, "large-int8" the same checkpoint with
+# int8 linear layers; the suffix-free name is the checkpoint passed to whisper.load_model
+DEFAULT_BACKEND = 'torch'
+
+def _plain_linears(module):
+    # whisper's Linear only casts its weights to the input dtype, quantize_dynamic
+    # accepts nothing but nn.Linear
+    for name, child in module.named_children():
+        if isinstance(child, WhisperLinear):
+            linear = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.load_state_dict(child.state_dict())
+            setattr(module, name, linear)
+        else:
+            _plain_linears(child)
+    return module
+
+def quantize_int8(model):
+    # weights of every linear layer (attention and MLP, most of the compute) stored as
+    # int8 and activations quantized on the fly; convolutions and embeddings stay fp32
+    return torch.ao.quantization.quantize_dynamic(_plain_linears(model.cpu()), {nn.Linear}, dtype=torch.qint8)
+
+BACKENDS = {
+    'torch': lambda model: model,
+    'int8':  quantize_int8,
+}
+# backends that only run on the CPU
+CPU_ONLY = {'int8'}
+
+def split_name(model_name):
+    # "large-int8" → ("large", "int8"), "large-v3" → ("large-v3", "torch")
+    checkpoint, _, suffix = model_name.rpartition('-')
+    if checkpoint and suffix in BACKENDS:
+        return checkpoint, suffix
+    return model_name, DEFAULT_BACKEND
+
+def backend_of(model_name):
+    return split_name(model_name)[1]
+
+def load_model(model_name):
+    checkpoint, backend = split_name(model_name)
+    device = 'cpu' if backend in CPU_ONLY else None
+    return BACKENDS[backend](whisper.load_model(checkpoint, device=device))
@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+import torch
+import whisper
+from common.chunking import chunk_bounds, stitch, OVERLAP_SECONDS
+
+# same thresholds model.transcribe uses by default
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# decoding preset → (temperatures tried in order, beam size); every temperature after
+# the first is a fallback re-decode of a clip whose output looked wrong
+PRESETS = {
+    'default': ((0.0, 0.2, 0.4, 0.6, 0.8, 1.0), None),  # model.transcribe's own schedule
+    'greedy':  ((0.0,), None),                          # no fallback, fixed cost per clip
+    'beam5':   ((0.0,), 5),                             # beam search, no fallback
+    'capped':  ((0.0, 0.4), None),                      # at most one fallback
+}
+DEFAULT_PRESET = 'default'
+
+# long-form chunks fit in one 30 s window, so every chunk goes through the batched decode
+CHUNK_SECONDS = 28
+CHUNK_TAG = f"chunk-{CHUNK_SECONDS}-{OVERLAP_SECONDS:g}"
+
+# temperatures of the decodes transcribe() runs on this thread, while one is counted
+_decodes = threading.local()
+
+def _count_decodes(model):
+    # wraps model.decode once; the model server transcribes on several threads, so
+    # every thread counts only its own calls
+    if getattr(model, '_counts_decodes', False):
+        return
+    decode = model.decode
+    def counted(mel, options=whisper.DecodingOptions()):
+        temperatures = getattr(_decodes, 'temperatures', None)
+        if temperatures is not None:
+            temperatures.append(options.temperature)
+        return decode(mel, options)
+    model.decode = counted
+    model._counts_decodes = True
+
+def transcribe_single(model, audio, language='hr', preset=DEFAULT_PRESET, fallbacks=None):
+    temperatures, beam_size = PRESETS[preset]
+    if fallbacks is None:
+        return model.transcribe(audio, language=language, temperature=temperatures, beam_size=beam_size)['text'].strip()
+    # counted per decode, windows dropped as silence leave no segment
+    _count_decodes(model)
+    _decodes.temperatures = decoded = []
+    try:
+        result = model.transcribe(audio, language=language, temperature=temperatures, beam_size=beam_size)
+    finally:
+        _decodes.temperatures = None
+    fallbacks.append(sum(t != temperatures[0] for t in decoded))
+    return result['text'].strip()
+
+def _needs_fallback(result):
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return False
+    return (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+            or result.avg_logprob < LOGPROB_THRESHOLD)
+
+def _is_silent(result):
+    return result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob <= LOGPROB_THRESHOLD
+
+def log_mel_batch(model, audios):
+    # the first window exactly as transcribe() builds it: the mel of the audio plus 30 s
+    # of silence, cut to the frames of the audio itself and only then padded
+    mels = []
+    for audio in audios:
+        mel = whisper.log_mel_spectrogram(np.asarray(audio, dtype=np.float32), model.dims.n_mels,
+                                          padding=whisper.audio.N_SAMPLES)
+        content_frames = mel.shape[-1] - whisper.audio.N_FRAMES
+        mels.append(whisper.pad_or_trim(mel[:, :content_frames], whisper.audio.N_FRAMES))
+    return torch.stack(mels).to(model.device)
+
+def _window_tokens(tokens, timestamp_begin, input_stride, content_frames):
+    # the tokens transcribe() keeps from a clip's first window, or None when it would
+    # seek back to the last complete timestamp and decode another window
+    is_timestamp = [t >= timestamp_begin for t in tokens]
+    consecutive = [i + 1 for i in range(len(tokens) - 1) if is_timestamp[i] and is_timestamp[i + 1]]
+    if not consecutive or is_timestamp[-2:] == [False, True]:
+        return tokens
+    last_slice = consecutive[-1]
+    if (tokens[last_slice - 1] - timestamp_begin) * input_stride < content_frames:
+        return None
+    return tokens[:last_slice]
+
+def decode_batch(model, mel, options):
+    if options.beam_size is None:
+        return whisper.decode(model, mel, options)
+    # whisper's beam search fails on more than one clip at a time: the batch is
+    # still encoded at once, the search runs clip by clip on the encoded audio
+    with torch.no_grad():
+        features = model.encoder(mel.half() if options.fp16 else mel)
+    return [whisper.decode(model, features[j:j + 1], options)[0] for j in range(len(features))]
+
+def transcribe_batch(model, audios, language='hr', preset=DEFAULT_PRESET, fallbacks=None):
+    temperatures, beam_size = PRESETS[preset]
+    hyps = [None] * len(audios)
+    counts = [0] * len(audios)
+    short = [i for i, a in enumerate(audios) if len(a) <= whisper.audio.N_SAMPLES]
+
+    if short:
+        mel = log_mel_batch(model, [audios[i] for i in short])
+        options = whisper.DecodingOptions(language=language, temperature=temperatures[0], beam_size=beam_size,
+                                          fp16=model.device.type == 'cuda')
+        tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                                    language=language, task='transcribe')
+        input_stride = whisper.audio.N_FRAMES // model.dims.n_audio_ctx
+        # one encoder pass and one batched decode for the whole batch
+        for i, result in zip(short, decode_batch(model, mel, options)):
+            # without a fallback temperature the first decode is final
+            if _needs_fallback(result) and len(temperatures) > 1:
+                continue
+            if _is_silent(result):
+                hyps[i] = ""
+                continue
+            content_frames = len(audios[i]) // whisper.audio.HOP_LENGTH
+            tokens = _window_tokens(result.tokens, tokenizer.timestamp_begin, input_stride, content_frames)
+            if tokens is not None:
+                hyps[i] = tokenizer.decode(tokens).strip()
+
+    # clips over 30 s and clips transcribe() would decode again go through transcribe();
+    # the batched decode thrown away counts as a fallback
+    batched = set(short)
+    for i, hyp in enumerate(hyps):
+        if hyp is None:
+            single = []
+            hyps[i] = transcribe_single(model, audios[i], language, preset, single)
+            counts[i] = single[0] + (i in batched)
+    if fallbacks is not None:
+        fallbacks.extend(counts)
+    return hyps
+
+def transcribe_files(model, audios, batch_size=8, language='hr', preset=DEFAULT_PRESET, fallbacks=None):
+    # fallbacks, when given, gets the number of fallback re-decodes of every clip
+    if batch_size <= 1:
+        return [transcribe_single(model, a, language, preset, fallbacks) for a in audios]
+    hyps = []
+    for start in range(0, len(audios), batch_size):
+        hyps.extend(transcribe_batch(model, audios[start:start + batch_size], language, preset, fallbacks))
+    return hyps
+
+def transcribe_chunked(model, audios, batch_size=8, language='hr', preset=DEFAULT_PRESET, fallbacks=None,
+                       max_seconds=CHUNK_SECONDS):
+    # long clips are cut into overlapping chunks, the chunks of all clips are batched
+    # together (so a long clip is decoded in parallel) and stitched back per clip
+    pieces, owners = [], []
+    for i, audio in enumerate(audios):
+        for start, end in chunk_bounds(audio, whisper.audio.SAMPLE_RATE, max_seconds):
+            pieces.append(audio[start:end])
+            owners.append(i)
+    texts = [[] for _ in audios]
+    piece_fallbacks = []
+    for owner, hyp in zip(owners, transcribe_files(model, pieces, batch_size, language, preset, piece_fallbacks)):
+        texts[owner].append(hyp)
+    if fallbacks is not None:
+        counts = [0] * len(audios)
+        for owner, n in zip(owners, piece_fallbacks):
+            counts[owner] += n
+        fallbacks.extend(counts)
+    return [stitch(t) for t in texts]
+
+def verify_batched(model, audios, batch_size=8, language='hr', preset=DEFAULT_PRESET):
+    batched = transcribe_files(model, audios, batch_size, language, preset)
+    mismatches = []
+    for i, (audio, hyp) in enumerate(zip(audios, batched)):
+        single = transcribe_single(model, audio, language, preset)
+        if single != hyp:
+            mismatches.append((i, hyp, single))
+    return mismatches
@@ -1,20 +1,27 @@
 import os
 import whisper
-import pandas as pd
 import numpy as np
-from jiwer import wer, cer, ToLowerCase, RemovePunctuation, Compose
-import matplotlib.pyplot as plt
 from tqdm import tqdm
-from scipy.stats import wilcoxon, mannwhitneyu
-import seaborn as sns
-import re
-import string
+import sys
+import argparse
+import time
+from itertools import chain
 
-def clean_for_wer(text: str) -> str:
-    text = re.sub(r"\[.*?\]", "", text)
-    text = text.casefold()
-    text = text.translate(str.maketrans("", "", string.punctuation))
-    return text
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.parallel import run_tasks, run_tasks_limited, merge_stream
+from common.pipeline import stage, run_pipeline
+from common.result_store import ResultStore
+from common.diacritics import LETTERS, HYP_LABELS, totals_and_errors
+from common.aggregates import Aggregates, STATE_NAME
+from common.metrics import score_pair, SCORING_VERSION
+from common.normalization import normalize
+from common.results_io import DATASET_DIR, ResultWriter, load_results
+from common.instrumentation import measure, measure_batch, finish, TimingLog, StackSampler
+from common import plots, vad, significance, corpus, scheduling, memory
+from audio_cache import AudioCache
+from batched import transcribe_files, transcribe_chunked, verify_batched, CHUNK_TAG, PRESETS, DEFAULT_PRESET
+from model_server import ModelClient
+from backends import load_model, backend_of, BACKENDS, DEFAULT_BACKEND
 
 MALE_TXT_DIR   = r".\whisper\\test\\testtxtM\\cleaned"
 MALE_WAV_DIR   = r".\whisper\\test\\testwavM"
@@ -22,183 +29,447 @@ FEMALE_TXT_DIR = r".\whisper\\test\\testtxtF\\cleaned"
 FEMALE_WAV_DIR = r".\whisper\\test\\testwavF"
 
 MODELS     = ["small", "medium", "large"]
+# --backend int8 adds these checkpoints again as "large-int8" (int8 linear layers, see
+# backends.py); the row records its inference backend so the speed/accuracy trade-off
+# shows in the plots
+BACKEND_MODELS = ["large"]
 OUTPUT_DIR = r".\whisper\\test\whisper_outputs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def get_ids(txt_dir):
-    return [os.path.splitext(f)[0] for f in os.listdir(txt_dir) if f.endswith('.txt')]
-
-male_ids   = get_ids(MALE_TXT_DIR)
-female_ids = get_ids(FEMALE_TXT_DIR)
-file_list  = [('m', fid) for fid in male_ids] + [('f', fid) for fid in female_ids]
-
-diac_chars = ['č','ć','š','ž','đ','Č','Ć','Š','Ž','Đ']
-
-results = []
-for model_name in tqdm(MODELS, desc="Models"):
-    model = whisper.load_model(model_name)
-    for gender, fid in tqdm(file_list, desc=f"{model_name}", leave=False):
-        wav_dir = MALE_WAV_DIR   if gender=='m' else FEMALE_WAV_DIR
-        txt_dir = MALE_TXT_DIR   if gender=='m' else FEMALE_TXT_DIR
-        wav_path = os.path.join(wav_dir, f"{fid}.wav")
-        txt_path = os.path.join(txt_dir, f"{fid}.txt")
-        if not os.path.exists(wav_path) or not os.path.exists(txt_path):
-            continue
-
-        out = model.transcribe(wav_path, language='hr')
-        hyp = out['text'].strip()
-
-        with open(txt_path, encoding='utf-8') as f:
-            ref = f.read().strip()
-
-        cr = clean_for_wer(ref)
-        ch = clean_for_wer(hyp)
-        
-        w = wer(cr, ch)
-        c = cer(cr, ch)
-        
-        total_diacs = sum(ref.count(ch) for ch in diac_chars)
-        wrong = sum(
-            1 for i, r in enumerate(ref)
-            if r in diac_chars and (i >= len(hyp) or hyp[i].lower() != r.lower())
-        )
-        der = wrong / total_diacs if total_diacs > 0 else np.nan
-
-        results.append({
-            'model':   model_name,
-            'gender':  gender,
-            'file_id': fid,
-            'wer':     w,
-            'cer':     c,
-            'der':     der,
-            'ref':     ref,
-            'hyp':     hyp
-        })
-
-
-import matplotlib.pyplot as plt
-
-letters = ['č','ć','š','ž','đ']
-total = {m:{ch:0 for ch in letters} for m in MODELS}
-errors = {m:{ch:0 for ch in letters} for m in MODELS}
-
-for rec in results:
-    model = rec['model']
-    ref, hyp = rec['ref'], rec['hyp']
-    for ch in letters:
-        cnt = ref.lower().count(ch)
-        total[model][ch] += cnt
-        for i, r in enumerate(ref.lower()):
-            if r == ch:
-                if i >= len(hyp) or hyp.lower()[i] != ch:
-                    errors[model][ch] += 1
-
-for model in MODELS:
-    rates = [ errors[model][ch]/total[model][ch] 
-              if total[model][ch]>0 else 0
-              for ch in letters ]
-    plt.figure()
-    plt.bar(letters, rates)
-    plt.title(f"DER po slovu  –  {model}")
-    plt.ylabel("Error rate")
-    plt.savefig(os.path.join(OUTPUT_DIR, f"der_per_letter_{model}.png"))
-    plt.show()
-
-df = pd.DataFrame(results)
-csv_path = os.path.join(OUTPUT_DIR, "metrics.csv")
-df.to_csv(csv_path, index=False)
-print(f"\nMetrics saved to: {csv_path}")
-print(df.head())
-
-for gender, label in [('m', 'Muški'), ('f', 'Ženski')]:
-    fig, ax = plt.subplots()
-    data = [ df[(df['model']==m) & (df['gender']==gender)]['wer'] for m in MODELS ]
-    ax.boxplot(data, labels=MODELS)
-    ax.set_title(f"WER - {label}")
-    ax.set_xlabel("Model")
-    ax.set_ylabel("WER")
-    fig.savefig(os.path.join(OUTPUT_DIR, f"wer_boxplot_{gender}.png"))
-    plt.show()
-    
-der_summary = df.groupby('model')['der'].mean()
-fig, ax = plt.subplots()
-ax.bar(der_summary.index, der_summary.values)
-ax.set_title("Prosječni DER po modelu")
-ax.set_ylabel("DER")
-fig.savefig(os.path.join(OUTPUT_DIR, "avg_der_per_model.png"))
-plt.show()
-
-stats = df.groupby(['model','gender'])[['wer','cer','der']].agg(['mean','median','std'])
-print("=== Agregirane statistike ===")
-print(stats, "\n")
-
-for gender,label in [('m','Muški'), ('f','Ženski')]:
-    w_small = df[(df['gender']==gender)&(df['model']=='small')]['wer']
-    w_large = df[(df['gender']==gender)&(df['model']=='large')]['wer']
-    stat, p = wilcoxon(w_small, w_large)
-    print(f"Wilcoxon WER {label}: small vs large → p = {p:.3f}")
-
-for model in df['model'].unique():
-    w_m = df[(df['model']==model)&(df['gender']=='m')]['wer']
-    w_f = df[(df['model']==model)&(df['gender']=='f')]['wer']
-    stat, p = mannwhitneyu(w_m, w_f, alternative='two-sided')
-    print(f"Mann–Whitney WER small vs large za model {model}: p = {p:.3f}")
+RESULT_STORE_PATH     = os.path.join(OUTPUT_DIR, "results.sqlite")
+CORPUS_MANIFEST       = os.path.join(OUTPUT_DIR, "corpus_manifest.json")
+AUDIO_CACHE_DIR       = os.path.join(OUTPUT_DIR, "audio_cache")
+AUDIO_CACHE_MAX_BYTES = 512 * 1024 * 1024
 
-from tqdm import tqdm
-from collections import Counter
-
-letters = ['č','ć','š','ž','đ']
-der_per_letter = {m: {ch: 0 for ch in letters} for m in MODELS}
-total_per_letter = {ch: 0 for ch in letters}
-
-for rec in tqdm(results, desc="Counting DER per letter"):
-    model = rec['model']
-    ref = rec['ref'].lower()
-    hyp = rec['hyp'].lower()
-    for ch in letters:
-        total_per_letter[ch] += ref.count(ch)
-        der_per_letter[model][ch] += sum(
-            1 for i, r in enumerate(ref)
-            if r == ch and (i >= len(hyp) or hyp[i] != ch)
-        )
-
-for model in tqdm(MODELS, desc="Plotting DER bars"):
-    rates = [
-        der_per_letter[model][ch] / total_per_letter[ch]
-        if total_per_letter[ch] > 0 else 0
-        for ch in letters
+# BATCH_SIZE = 1 runs the original per-file model.transcribe path
+BATCH_SIZE     = 8
+VERIFY_BATCHED = False
+
+# threads per pipeline stage and items waiting between two stages
+DECODE_THREADS      = 2
+SCORE_THREADS       = 2
+PIPELINE_QUEUE_SIZE = 16
+
+RESULT_COLUMNS = ['model', 'inference_backend', 'decoding_preset', 'gender', 'file_id', 'wer', 'cer', 'der', 'rtf', 'fallbacks', 'ref', 'hyp']
+TIMED_STAGES   = ['decode', 'inference', 'score']
+
+def get_corpus():
+    # one listing per directory; durations, speakers and audio hashes come from the
+    # manifest, only new or modified .wav files are read
+    return corpus.scan([(MALE_WAV_DIR, MALE_TXT_DIR, 'm'), (FEMALE_WAV_DIR, FEMALE_TXT_DIR, 'f')], CORPUS_MANIFEST)
+
+def existing_files(entries):
+    return [(e.gender, e.file_id, e.path, e.transcript_path, e.audio_hash) for e in entries if e.transcript_path]
+
+def score(model_name, gender, fid, ref, hyp):
+    m = score_pair(ref, hyp, normalize)
+
+    row = {
+        'model':   model_name,
+        'inference_backend': backend_of(model_name),
+        'gender':  gender,
+        'file_id': fid,
+        'wer':     m['wer'],
+        'cer':     m['cer'],
+        'der':     m['der'],
+        'ref':     ref,
+        'hyp':     hyp
+    }
+    return row, m['alignment']
+
+# per-process state, every worker loads a model once and keeps it for all its shards
+_loaded_model = (None, None)
+_audio_cache  = None
+_store        = None
+_model_client = None
+_memory_guard = None
+
+def init_worker(n_threads, max_rss=None, root_pid=None):
+    global _memory_guard
+    if n_threads:
+        import torch
+        torch.set_num_threads(n_threads)
+    if max_rss:
+        # the whole run (main process and all workers) shares one RSS ceiling
+        _memory_guard = memory.MemoryGuard(max_rss, root_pid)
+
+def release_model():
+    # the old model is freed before the next one is loaded, never both in memory at once
+    global _loaded_model
+    _loaded_model = (None, None)
+    memory.release()
+
+def get_model(model_name):
+    global _loaded_model
+    if _loaded_model[0] != model_name:
+        release_model()
+        _loaded_model = (model_name, load_model(model_name))
+    return _loaded_model[1]
+
+def get_audio_cache():
+    global _audio_cache
+    if _audio_cache is None:
+        # every .wav is decoded once and the same float32 buffer is reused by all models
+        _audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+    return _audio_cache
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ResultStore(RESULT_STORE_PATH)
+    return _store
+
+def get_model_client():
+    global _model_client
+    if _model_client is None:
+        _model_client = ModelClient()
+    return _model_client
+
+def shard_rows(model_idx, model_name, shard, batch_size, use_server=False, trim=False, chunk=False, preset=DEFAULT_PRESET):
+    # decode → transcribe → score → store, each stage in its own threads with bounded
+    # queues between them, so decoding and scoring run while the model is busy;
+    # with use_server the model stays loaded in model_server.py between runs,
+    # with chunk long clips are transcribed as overlapping chunks and stitched
+    if use_server:
+        client = get_model_client()
+        run_model = lambda audios, fallbacks: client.transcribe(model_name, audios, batch_size, 'hr', chunk, preset, fallbacks)
+    else:
+        model = get_model(model_name)
+        transcribe_audios = transcribe_chunked if chunk else transcribe_files
+        run_model = lambda audios, fallbacks: transcribe_audios(model, audios, batch_size, 'hr', preset, fallbacks)
+    audio_cache = get_audio_cache()
+    store = get_store()
+
+    def decode(entry):
+        item_idx, item = entry
+        stats = {}
+        read = []
+        with measure(stats, 'decode') as timer:
+            audio = audio_cache.get(item[2], trim, read)
+            timer.n_bytes = sum(read)
+        return item_idx, item, audio, stats
+
+    def transcribe(batch):
+        audios = [audio for _, _, audio, _ in batch]
+        # torch computes on its own threads, so the whole process is charged
+        fallbacks, hyps = [], []
+        # near the RSS ceiling the batch is split into smaller ones
+        size = _memory_guard.batch_size(len(audios)) if _memory_guard is not None else len(audios)
+        with measure_batch([stats for *_, stats in batch], 'inference', cpu_clock=time.process_time):
+            for start in range(0, len(audios), size):
+                hyps.extend(run_model(audios[start:start + size], fallbacks))
+        if VERIFY_BATCHED and batch_size > 1 and not use_server and not chunk:
+            for i, batched_hyp, single_hyp in verify_batched(model, audios, batch_size, 'hr', preset):
+                print(f"Razlika batch/pojedinačno za {batch[i][1][1]}: '{batched_hyp}' != '{single_hyp}'")
+        return [(item_idx, item, hyp, n_fallbacks, stats, len(audio) / whisper.audio.SAMPLE_RATE)
+                for (item_idx, item, audio, stats), hyp, n_fallbacks in zip(batch, hyps, fallbacks)]
+
+    def score_item(entry):
+        item_idx, (gender, fid, wav_path, txt_path, audio_hash), hyp, n_fallbacks, stats, audio_s = entry
+        with measure(stats, 'score', os.path.getsize(txt_path)):
+            with open(txt_path, encoding='utf-8') as f:
+                ref = f.read().strip()
+            row, alignment = score(model_name, gender, fid, ref, hyp)
+        row['decoding_preset'] = preset
+        row['fallbacks'] = n_fallbacks
+        return item_idx, audio_hash, row, alignment, stats, audio_s
+
+    def save(entry):
+        item_idx, audio_hash, row, alignment, stats, audio_s = entry
+        row['rtf'] = finish(stats, audio_s)['rtf']
+        store.put(model_name, row['file_id'], audio_hash, row, alignment, stats, SCORING_VERSION)
+        return (model_idx, item_idx), row
+
+    stages = [
+        stage('decode', decode, DECODE_THREADS),
+        stage('transcribe', transcribe, 1, max(batch_size, 1)),
+        stage('score', score_item, SCORE_THREADS),
+        stage('store', save),
     ]
-    plt.figure()
-    plt.bar(letters, rates)
-    plt.title(f"DER po slovu – {model}")
-    plt.ylabel("Error rate")
-    plt.savefig(os.path.join(OUTPUT_DIR, f"der_per_letter_{model}.png"))
-    plt.show()
-
-tqdm.write("Plotting violinplot for WER distribution…")
-plt.figure()
-sns.violinplot(data=df, x='model', y='wer', hue='gender', split=True)
-plt.title("Distribucija WER po modelu i spolu")
-plt.savefig(os.path.join(OUTPUT_DIR, "wer_violinplot.png"))
-plt.show()
-
-tqdm.write("Computing confusion pairs for diacritics…")
-conf = {m: Counter() for m in MODELS}
-for rec in tqdm(results, desc="Counting confusion pairs"):
-    model = rec['model']
-    r, h = rec['ref'].lower(), rec['hyp'].lower()
-    for i, char in enumerate(r):
-        if char in letters:
-            hyp_char = h[i] if i < len(h) else None
-            conf[model][(char, hyp_char)] += 1
-
-print("Confusion č/ć/š/ž/đ za model large:")
-for (r, h), cnt in conf['large'].most_common(10):
-    print(f"  {r} → {h} : {cnt} puta")
-
-tqdm.write("Plotting WER boxplot across models…")
-plt.figure()
-sns.boxplot(data=df, x='model', y='wer')
-plt.title("WER usporedba svih modela")
-plt.savefig(os.path.join(OUTPUT_DIR, "wer_boxplot_all_models.png"))
-plt.show()
\ No newline at end of file
+    yield from run_pipeline(shard, stages, PIPELINE_QUEUE_SIZE)
+
+def transcribe_shard(model_idx, model_name, shard, batch_size, use_server=False, trim=False, chunk=False, preset=DEFAULT_PRESET):
+    # pool workers send a whole shard back at once, with the time span it took
+    return scheduling.timed_task(lambda: list(shard_rows(model_idx, model_name, shard, batch_size, use_server, trim, chunk, preset)))
+
+def restore_row(row, model_name, timings):
+    # rows stored before the backend, preset and RTF were part of the row
+    row.setdefault('inference_backend', backend_of(model_name))
+    row.setdefault('decoding_preset', DEFAULT_PRESET)
+    row.setdefault('fallbacks', None)
+    row.setdefault('rtf', (timings or {}).get('rtf'))
+    return row
+
+def rescore(row, model_name):
+    # metrics and alignment of a row stored by another SCORING_VERSION, from its own
+    # ref and hyp (the transcription stays, only scoring is redone)
+    scored, alignment = score(model_name, row['gender'], row['file_id'], row['ref'], row['hyp'])
+    row.update({k: scored[k] for k in ('wer', 'cer', 'der')})
+    return row, alignment
+
+def evaluate(items, batch_size=BATCH_SIZE, workers=1, rerun=False, use_server=False, trim=False, chunk=False,
+             preset=DEFAULT_PRESET, durations=None, max_rss=None):
+    # generator over all rows, model by model in corpus order; the schedule only decides
+    # the shards. durations: {wav_path: seconds} from the corpus manifest.
+    # With max_rss (MB) rows go out as they finish and batches and workers shrink near the ceiling
+    n_shards = workers * scheduling.SHARDS_PER_WORKER if workers > 1 else 1
+    durations = durations or {}
+    # 16 kHz 16-bit mono is 32000 bytes per second
+    duration = lambda entry: durations.get(entry[1][2]) or os.path.getsize(entry[1][2]) / 32000
+    # separate connection, closed before any worker process is started
+    store = ResultStore(RESULT_STORE_PATH)
+
+    stored_rows = []
+    tasks = []
+    keys = []
+    for m_idx, model_name in enumerate(MODELS):
+        done = {} if rerun else store.load(model_name)
+        timings = store.load_timings(model_name) if done else {}
+        versions = store.load_versions(model_name) if done else {}
+        missing, rescored = [], 0
+        for item_idx, item in enumerate(items):
+            row = done.get((item[1], item[4]))
+            if row is not None and versions.get((item[1], item[4])) != SCORING_VERSION:
+                row, alignment = rescore(row, model_name)
+                store.put(model_name, item[1], item[4], row, alignment, timings.get((item[1], item[4])), SCORING_VERSION)
+                rescored += 1
+            if row is None:
+                missing.append((item_idx, item))
+            elif max_rss:
+                stored_rows.append(((m_idx, item_idx), (model_name, item[1], item[4], timings.get((item[1], item[4])))))
+            else:
+                stored_rows.append(((m_idx, item_idx), restore_row(row, model_name, timings.get((item[1], item[4])))))
+        if done:
+            print(f"{model_name}: {len(items) - len(missing)} isječaka već obrađeno, preostalo {len(missing)}")
+        if rescored:
+            print(f"{model_name}: {rescored} spremljenih redaka ponovno ocijenjeno (verzija ocjenjivanja {SCORING_VERSION})")
+        del done, timings, versions
+        _, shards = scheduling.plan(missing, duration, n_shards)
+        if workers > 1:
+            scheduling.describe(model_name, shards, duration, workers)
+        keys.extend((m_idx, item_idx) for item_idx in range(len(items)))
+        tasks.extend((m_idx, model_name, shard, batch_size, use_server, trim, chunk, preset) for _, shard in shards)
+    store.close()
+    n_threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+    worker_args = (n_threads, max_rss, os.getpid())
+
+    def stored():
+        if not max_rss:
+            yield from stored_rows
+            return
+        lookup = ResultStore(RESULT_STORE_PATH)
+        for key, (model_name, fid, audio_hash, timings) in stored_rows:
+            yield key, restore_row(lookup.get(model_name, fid, audio_hash), model_name, timings)
+        lookup.close()
+
+    def new_rows(bar):
+        if workers <= 1:
+            init_worker(*worker_args)
+            for task in tasks:
+                for keyed_row in shard_rows(*task):
+                    bar.update(1)
+                    yield keyed_row
+            return
+        utilization = scheduling.Utilization()
+        if max_rss:
+            guard = memory.MemoryGuard(max_rss)
+            finished = run_tasks_limited(transcribe_shard, tasks, workers, guard.near, init_worker, worker_args)
+        else:
+            finished = run_tasks(transcribe_shard, tasks, workers, init_worker, worker_args)
+        for task, (rows, span) in finished:
+            bar.update(len(rows))
+            utilization.add(span)
+            yield from rows
+        utilization.report()
+
+    with tqdm(total=sum(len(t[2]) for t in tasks), desc="Transkripcija") as bar:
+        rows = chain(stored(), new_rows(bar))
+        if max_rss:
+            for _, row in rows:
+                yield row
+        else:
+            yield from merge_stream(rows, keys)
+
+def save_results(rows, export_csv=True):
+    # every row goes to the Parquet dataset (and metrics.csv) as soon as it is produced
+    csv_path = os.path.join(OUTPUT_DIR, "metrics.csv") if export_csv else None
+    n_rows = 0
+    with ResultWriter('whisper', csv_path=csv_path, csv_columns=RESULT_COLUMNS) as writer:
+        for row in rows:
+            writer.append(row)
+            n_rows += 1
+    print(f"\nMetrics saved to: {DATASET_DIR} ({n_rows} rows)")
+    if csv_path:
+        print(f"Metrics saved to: {csv_path}")
+
+def save_timings(items):
+    # sidecar next to metrics.csv: cost of every stage per (model, file) from the run
+    # that produced the stored row
+    store = ResultStore(RESULT_STORE_PATH)
+    with TimingLog(os.path.join(OUTPUT_DIR, "timings.csv"), TIMED_STAGES) as log:
+        for model_name in MODELS:
+            timings = store.load_timings(model_name)
+            for gender, fid, wav_path, txt_path, audio_hash in items:
+                stats = timings.get((fid, audio_hash))
+                if stats is not None:
+                    log.append(model_name, fid, stats)
+    store.close()
+
+def tagged_items(items, tag):
+    # trimmed or chunked audio and other decoding presets give other transcriptions:
+    # their rows are stored under their own key
+    return [(gender, fid, wav_path, txt_path, f"{audio_hash}:{tag}")
+            for gender, fid, wav_path, txt_path, audio_hash in items]
+
+def save_vad_report(items):
+    audio_cache = get_audio_cache()
+    sr = whisper.audio.SAMPLE_RATE
+    vad.write_report(os.path.join(OUTPUT_DIR, "vad_report.csv"), [
+        (fid, len(audio_cache.get(wav_path)) / sr, len(audio_cache.get(wav_path, True)) / sr)
+        for gender, fid, wav_path, txt_path, audio_hash in items
+    ])
+
+def check_vad(items):
+    # WER of the stored untrimmed rows against the trimmed ones, model by model
+    store = ResultStore(RESULT_STORE_PATH)
+    ok = True
+    for model_name in MODELS:
+        done = store.load(model_name)
+        plain, trimmed = {}, {}
+        for gender, fid, wav_path, txt_path, audio_hash in items:
+            if (fid, audio_hash) in done:
+                plain[fid] = done[(fid, audio_hash)]['wer']
+            if (fid, f"{audio_hash}:{vad.TAG}") in done:
+                trimmed[fid] = done[(fid, f"{audio_hash}:{vad.TAG}")]['wer']
+        ok = vad.compare_wer(plain, trimmed, model_name) and ok
+    store.close()
+    return ok
+
+def analyze(df, plot_workers=None):
+    # sums and diacritic confusions are kept per (model, gender) between runs, only rows
+    # that were re-transcribed since the last analysis are aligned again
+    model_idx = {m: i for i, m in enumerate(MODELS)}
+    aggregates = Aggregates(os.path.join(OUTPUT_DIR, STATE_NAME))
+    changed = aggregates.update(df)
+    by_model = aggregates.confusion(['model'])
+    empty = np.zeros((len(LETTERS), len(HYP_LABELS)), dtype=np.int64)
+    conf = np.stack([by_model.get((m,), empty) for m in MODELS])
+    total, errors = totals_and_errors(conf)
+
+    figures = []
+    for m_idx, model in enumerate(MODELS):
+        rates = np.divide(errors[m_idx], total[m_idx], out=np.zeros(len(LETTERS)), where=total[m_idx] > 0)
+        figures.append(plots.figure(
+            os.path.join(OUTPUT_DIR, f"der_per_letter_{model}.png"), plots.bar,
+            {'x': LETTERS, 'y': rates.tolist()}, title=f"DER po slovu  –  {model}", ylabel="Error rate"
+        ))
+
+    for gender, label in [('m', 'Muški'), ('f', 'Ženski')]:
+        data = {m: df[(df['model']==m) & (df['gender']==gender)]['wer'].tolist() for m in MODELS}
+        figures.append(plots.figure(
+            os.path.join(OUTPUT_DIR, f"wer_boxplot_{gender}.png"), plots.grouped_boxplot,
+            data, title=f"WER - {label}", xlabel="Model", ylabel="WER"
+        ))
+
+    der_summary = aggregates.moments(['model'])[('der', 'mean')]
+    figures.append(plots.figure(
+        os.path.join(OUTPUT_DIR, "avg_der_per_model.png"), plots.bar,
+        {'x': der_summary.index.get_level_values('model').tolist(), 'y': der_summary.values.tolist()},
+        title="Prosječni DER po modelu", ylabel="DER"
+    ))
+
+    stats = aggregates.moments(['model', 'gender'])
+    print("=== Agregirane statistike ===")
+    print(stats, "\n")
+
+    # fallback re-decodes are where the slow files come from
+    fallbacks = df.groupby(['model', 'decoding_preset'], observed=True).agg(
+        fallbacks=('fallbacks', 'sum'), files_with_fallback=('fallbacks', lambda f: int((f > 0).sum())), rtf_p95=('rtf', lambda r: r.quantile(0.95)))
+    print("=== Ponovna dekodiranja (fallback) i p95 RTF ===")
+    print(fallbacks, "\n")
+
+    # every pair of models, paired by file_id, and m vs f for every model in one pass
+    if changed or not os.path.exists(os.path.join(OUTPUT_DIR, "stats_intervals.csv")):
+        significance.report(df, OUTPUT_DIR)
+    else:
+        print(f"Statistička značajnost: nema promijenjenih redaka, tablice u '{OUTPUT_DIR}' su aktualne\n")
+
+    wer_df = df[['model', 'gender', 'wer']]
+    figures.append(plots.figure(
+        os.path.join(OUTPUT_DIR, "wer_violinplot.png"), plots.violinplot,
+        wer_df, x='model', y='wer', hue='gender', split=True, title="Distribucija WER po modelu i spolu"
+    ))
+
+    if 'large' in model_idx:
+        print("Confusion č/ć/š/ž/đ za model large:")
+        large = conf[model_idx['large']]
+        for flat in np.argsort(large, axis=None)[::-1][:10]:
+            r, h = np.unravel_index(flat, large.shape)
+            if large[r, h] == 0:
+                break
+            print(f"  {LETTERS[r]} → {HYP_LABELS[h]} : {large[r, h]} puta")
+
+    figures.append(plots.figure(
+        os.path.join(OUTPUT_DIR, "wer_boxplot_all_models.png"), plots.boxplot,
+        wer_df[['model', 'wer']], x='model', y='wer', title="WER usporedba svih modela"
+    ))
+
+    tqdm.write("Iscrtavanje grafova…")
+    plots.render_all(figures, plot_workers)
+    aggregates.save()
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluacija Whisper modela nad VEPRAD isječcima")
+    parser.add_argument('--workers', type=int, default=1, help="broj procesa za paralelnu evaluaciju")
+    parser.add_argument('--rerun', action='store_true', help="ponovno transkribiraj i isječke koji su već u spremištu rezultata")
+    parser.add_argument('--no-csv', action='store_true', help="ne zapisuj metrics.csv (samo Parquet skup rezultata)")
+    parser.add_argument('--plot-workers', type=int, default=None, help="broj procesa za iscrtavanje grafova")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="broj isječaka po batchu (1 = datoteka po datoteka)")
+    parser.add_argument('--profile', default=None, help="uzorkuj stogove svih dretvi glavnog procesa u datoteku (folded format za flamegraph)")
+    parser.add_argument('--server', action='store_true', help="transkribiraj preko pokrenutog model_server.py umjesto učitavanja modela")
+    parser.add_argument('--vad', action='store_true', help="odreži tišinu na početku i kraju isječaka prije transkripcije")
+    parser.add_argument('--chunk', action='store_true', help="dugi isječci se dijele na preklapajuće dijelove koji se transkribiraju paralelno i spajaju")
+    parser.add_argument('--preset', choices=list(PRESETS), default=DEFAULT_PRESET,
+                        help="dekodiranje: default (Whisperove ponovne temperature), greedy (bez ponavljanja), beam5, capped (najviše jedno ponavljanje)")
+    parser.add_argument('--vad-check', action='store_true', help="usporedi WER spremljenih rezultata bez i s --vad (izlazni kod 1 ako je lošiji)")
+    parser.add_argument('--backend', action='append', default=[], choices=[b for b in BACKENDS if b != DEFAULT_BACKEND],
+                        help="uz zadane modele pokreni i modele iz BACKEND_MODELS s ovim backendom (int8 → large-int8)")
+    parser.add_argument('--max-rss', type=int, default=None,
+                        help="način s ograničenom memorijom: gornja granica RSS-a u MB za glavni i sve radne procese; blizu nje smanjuju se batch i broj procesa")
+    args = parser.parse_args()
+    global MODELS
+    MODELS = MODELS + [f"{m}-{backend}" for backend in args.backend for m in BACKEND_MODELS]
+    if args.max_rss:
+        if args.server:
+            # the models live in model_server.py, outside this process tree
+            parser.error("--max-rss ne može ograničiti memoriju poslužitelja modela (--server)")
+        try:
+            memory.MemoryGuard(args.max_rss)
+        except RuntimeError as e:
+            parser.error(f"--max-rss: {e}")
+
+    entries = get_corpus()
+    items = existing_files(entries)
+    run_items = tagged_items(items, vad.TAG) if args.vad else items
+    if args.chunk:
+        run_items = tagged_items(run_items, CHUNK_TAG)
+    if args.preset != DEFAULT_PRESET:
+        run_items = tagged_items(run_items, f"preset-{args.preset}")
+    sampler = StackSampler(args.profile).start() if args.profile else None
+    save_results(evaluate(run_items, args.batch_size, max(args.workers, 1), args.rerun, args.server, args.vad, args.chunk, args.preset,
+                          {e.path: e.duration_s for e in entries}, args.max_rss), not args.no_csv)
+    if sampler is not None:
+        sampler.stop()
+    # with --workers 1 the last model is still loaded in this process
+    release_model()
+    save_timings(run_items)
+    if args.vad:
+        save_vad_report(items)
+    # analysis reads the rows back from disk, the run itself never keeps them all
+    analyze(load_results(DATASET_DIR, columns=RESULT_COLUMNS, backend='whisper'), args.plot_workers)
+
+    if args.vad_check and not check_vad(items):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
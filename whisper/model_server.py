@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import secrets
+import argparse
+import threading
+import numpy as np
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batched import transcribe_files, transcribe_chunked, DEFAULT_PRESET
+from backends import load_model
+
+# local only, on a free port picked per run; jobs are pickled, so a connection is only
+# accepted after the HMAC challenge with a random per-run key, which the server writes
+# (with the port) to a file only this user can read and the client reads back
+HOST = '127.0.0.1'
+CONNECTION_FILE = os.path.join(os.path.expanduser('~'), '.whisper_model_server.json')
+
+def write_connection_file(address, authkey, path=CONNECTION_FILE):
+    # created 0600 from the start, never readable by other users even briefly
+    fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'host': address[0], 'port': address[1], 'authkey': authkey.hex()}, f)
+    os.replace(path + ".tmp", path)
+
+def read_connection_file(path=CONNECTION_FILE):
+    if not os.path.exists(path):
+        raise ConnectionError(f"Poslužitelj modela nije pokrenut (nema '{path}')")
+    with open(path, encoding='utf-8') as f:
+        info = json.load(f)
+    return (info['host'], info['port']), bytes.fromhex(info['authkey'])
+
+class ModelServer:
+    # keeps every model it has loaded in memory and transcribes batches sent by
+    # ModelClient, one thread per connection, one job at a time per model
+    def __init__(self, port=0, connection_file=CONNECTION_FILE):
+        self.address = (HOST, port)
+        self.authkey = secrets.token_bytes(32)
+        self.connection_file = connection_file
+        self.models = {}
+        self._model_locks = {}
+        self._load_lock = threading.Lock()
+        self._stopping = False
+
+    def get_model(self, model_name):
+        with self._load_lock:
+            if model_name not in self.models:
+                start = time.perf_counter()
+                self.models[model_name] = load_model(model_name)
+                self._model_locks[model_name] = threading.Lock()
+                print(f"Model {model_name} učitan za {time.perf_counter() - start:.1f} s")
+        return self.models[model_name], self._model_locks[model_name]
+
+    def handle(self, op, args):
+        if op == 'ping':
+            return 'pong'
+        if op == 'models':
+            return sorted(self.models)
+        if op == 'load':
+            for model_name in args[0]:
+                self.get_model(model_name)
+            return sorted(self.models)
+        if op == 'transcribe':
+            model_name, audios, batch_size, language, chunk, preset = args
+            model, lock = self.get_model(model_name)
+            run = transcribe_chunked if chunk else transcribe_files
+            fallbacks = []
+            with lock:
+                hyps = run(model, audios, batch_size, language, preset, fallbacks)
+            return hyps, fallbacks
+        raise ValueError(f"nepoznata naredba '{op}'")
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except EOFError:
+                    return
+                if op == 'shutdown':
+                    conn.send(('ok', None))
+                    self._stopping = True
+                    # wake up accept() in serve_forever
+                    Client(self.address, authkey=self.authkey).close()
+                    return
+                try:
+                    conn.send(('ok', self.handle(op, args)))
+                except Exception as e:
+                    conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            # port 0 binds a free port
+            self.address = listener.address
+            write_connection_file(self.address, self.authkey, self.connection_file)
+            print(f"Poslužitelj modela sluša na {self.address[0]}:{self.address[1]} (podaci za spajanje u '{self.connection_file}')")
+            try:
+                while not self._stopping:
+                    try:
+                        conn = listener.accept()
+                    except (AuthenticationError, EOFError, OSError):
+                        # a client without the key never gets to send a job
+                        continue
+                    threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+            finally:
+                if os.path.exists(self.connection_file):
+                    os.remove(self.connection_file)
+        print("Poslužitelj modela zaustavljen")
+
+class ModelClient:
+    def __init__(self, connection_file=CONNECTION_FILE):
+        address, authkey = read_connection_file(connection_file)
+        self._conn = Client(address, authkey=authkey)
+
+    def _call(self, op, *args):
+        self._conn.send((op, *args))
+        status, value = self._conn.recv()
+        if status == 'error':
+            raise RuntimeError(f"Poslužitelj modela: {value}")
+        return value
+
+    def ping(self):
+        return self._call('ping')
+
+    def models(self):
+        return self._call('models')
+
+    def load(self, model_names):
+        return self._call('load', list(model_names))
+
+    def transcribe(self, model_name, audios, batch_size=8, language='hr', chunk=False, preset=DEFAULT_PRESET, fallbacks=None):
+        # memory-mapped cache arrays are sent as plain arrays
+        hyps, counts = self._call('transcribe', model_name, [np.asarray(a) for a in audios], batch_size, language, chunk, preset)
+        if fallbacks is not None:
+            fallbacks.extend(counts)
+        return hyps
+
+    def shutdown(self):
+        return self._call('shutdown')
+
+    def close(self):
+        self._conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Poslužitelj koji drži Whisper modele učitane između pokretanja main.py")
+    parser.add_argument('--models', nargs='*', default=[], help="modeli koji se učitavaju odmah (ostali pri prvom zahtjevu)")
+    parser.add_argument('--port', type=int, default=0, help="TCP port na 127.0.0.1 (0 = slobodan port, drugi pri svakom pokretanju)")
+    parser.add_argument('--stop', action='store_true', help="zaustavi poslužitelj koji već radi")
+    parser.add_argument('--status', action='store_true', help="ispiši modele koje poslužitelj drži u memoriji")
+    args = parser.parse_args()
+    if args.stop or args.status:
+        client = ModelClient()
+        if args.status:
+            print(f"Učitani modeli: {', '.join(client.models()) or '-'}")
+        if args.stop:
+            client.shutdown()
+        client.close()
+        return
+
+    server = ModelServer(args.port)
+    for model_name in args.models:
+        server.get_model(model_name)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()